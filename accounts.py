@@ -0,0 +1,121 @@
+import bisect
+import hashlib
+import logging
+import threading
+import time
+from send_queue import SendQueue, RateLimiter
+
+VIRTUAL_NODES = 64
+UNHEALTHY_AFTER = 3
+COOLDOWN = 300
+
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class Account:
+    def __init__(self, name, browser=None, rate_per_minute=0, burst=1, weights=None, clock=time.monotonic):
+        self.name = name
+        self.browser = browser
+        self.clock = clock
+        self.limiter = RateLimiter(rate_per_minute, burst, clock)
+        self.queue = SendQueue(None, weights, self.limiter)
+        self.failures = 0
+        self.down_until = None
+
+    def healthy(self):
+        return self.down_until is None or self.clock() >= self.down_until
+
+    def record(self, ok):
+        if ok:
+            self.failures = 0
+            self.down_until = None
+            return False
+        self.failures += 1
+        if self.failures < UNHEALTHY_AFTER:
+            return False
+        self.failures = 0
+        self.down_until = self.clock() + COOLDOWN
+        return True
+
+
+class Sharder:
+    """Routes each recipient to an account on a consistent-hash ring.
+
+    A recipient stays on the same sender while it is healthy; when an account
+    is marked down its queued jobs move to the next healthy account on the ring.
+    """
+
+    def __init__(self, accounts, send):
+        self.accounts = {account.name: account for account in accounts}
+        self.send = send
+        self.lock = threading.Lock()
+        self.ring = sorted(
+            (ring_hash(f"{account.name}#{i}"), account.name)
+            for account in accounts
+            for i in range(VIRTUAL_NODES)
+        )
+        self.ring_keys = [key for key, _ in self.ring]
+        for account in accounts:
+            account.queue.dispatch = lambda job, account=account: self.dispatch(account, job)
+
+    def owners(self, number):
+        start = bisect.bisect(self.ring_keys, ring_hash(number))
+        seen = []
+        for i in range(len(self.ring)):
+            name = self.ring[(start + i) % len(self.ring)][1]
+            if name not in seen:
+                seen.append(name)
+                yield self.accounts[name]
+                if len(seen) == len(self.accounts):
+                    return
+
+    def route(self, number):
+        owners = list(self.owners(number))
+        for account in owners:
+            if account.healthy():
+                return account
+        return owners[0]
+
+    def put(self, job, lane="scheduled", campaign=None):
+        account = self.route(job["number"])
+        account.queue.put(job, lane, campaign)
+        return account
+
+    def dispatch(self, account, job):
+        ok = self.send(account, job)
+        with self.lock:
+            marked_down = account.record(ok)
+        if marked_down:
+            logging.warning(f"Account {account.name} marked unhealthy for {COOLDOWN}s, failing over its queue")
+            self.failover(account)
+
+    def failover(self, account):
+        moved = 0
+        kept = []
+        while True:
+            item = account.queue.get_nowait()
+            if item is None:
+                break
+            lane, job = item
+            target = next((owner for owner in self.owners(job["number"]) if owner.healthy()), None)
+            if target is None:
+                # Nobody else is healthy; keep the job here until this account comes back.
+                kept.append(item)
+                continue
+            target.queue.put(job, lane, job.get("campaign"))
+            moved += 1
+        for lane, job in kept:
+            account.queue.put(job, lane, job.get("campaign"))
+        logging.info(f"Moved {moved} queued jobs off account {account.name}")
+
+    def start(self):
+        for account in self.accounts.values():
+            threading.Thread(target=account.queue.run, daemon=True).start()
+
+    def __len__(self):
+        return sum(len(account.queue) for account in self.accounts.values())
+
+    def depth(self):
+        return {name: len(account.queue) for name, account in self.accounts.items()}
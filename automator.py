@@ -7,6 +7,11 @@ import logging
 import multiprocessing
 from datetime import datetime, date
 from plyer import notification
+from job_store import JobStore, content_id, normalize_job
+from media_cache import cache_attachment
+from history import HistoryRecord, HistoryWindow
+from send_stats import SendStats
+from ui_profiler import UIProfiler
 
 logging.basicConfig(
     filename="automator.log",
@@ -14,6 +19,11 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
+HISTORY_SHOWN = 5
+HISTORY_PAGE = 20
+STATS_DAYS = 7
+STATS_TOP = 5
+
 class PERSONAutomator:
     def __init__(self, page: ft.Page):
         self.page = page
@@ -30,9 +40,25 @@ class PERSONAutomator:
         self.settings_file = "PERSON_settings.json"
         self.history_file = "send_history.json"
         self.schedule_file = "schedule.json"
+        # Imported here so the scheduler's log setup does not replace the app's.
+        from scheduler import load_settings as load_scheduler_settings
+        self.scheduler_settings = load_scheduler_settings("scheduler_settings.json")
+        self.jobs_file = self.scheduler_settings["job_store"]
+        self.job_store = JobStore(self.jobs_file)
+        self.stats_file = self.scheduler_settings["stats_file"]
+        self.stats = SendStats(self.stats_file, self.history_file)
         self.settings = self.load_settings()
         self.history = self.load_history()
         self.scheduler_process = None
+        self.send_inbox = multiprocessing.Queue()
+
+        self.profiler = None
+        if os.environ.get("AUTOMATOR_PROFILE"):
+            # Opt-in: time every handler and press F9 to start/stop a cProfile capture.
+            self.profiler = UIProfiler(self.page)
+            self.profiler.instrument(self)
+            self.page.on_keyboard_event = self.profiler.on_keyboard
+            logging.info("UI profiling enabled")
 
         self.setup_ui()
 
@@ -72,28 +98,23 @@ class PERSONAutomator:
             self.show_alert(f"Error saving settings: {str(e)}", ft.colors.RED_400)
 
     def load_history(self):
+        # Only the most recent entries stay in memory; older ones are read from disk on demand.
+        history = HistoryWindow(self.history_file, HISTORY_SHOWN, HISTORY_PAGE)
         try:
-            if os.path.exists(self.history_file):
-                with open(self.history_file, "r") as f:
-                    return json.load(f)
+            history.load()
         except Exception as e:
             logging.error(f"Error loading history: {str(e)}")
             self.show_alert(f"Error loading history: {str(e)}", ft.colors.RED_400)
-        return []
+        return history
 
-    def save_history(self, number, message, status, error=None):
+    def save_history(self, number, message, status, error=None, latency=None):
         try:
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            history_entry = {
-                "timestamp": timestamp,
-                "number": number,
-                "message": message,
-                "status": status,
-                "error": error if error else ""
-            }
-            self.history.append(history_entry)
-            with open(self.history_file, "w") as f:
-                json.dump(self.history, f, indent=2)
+            entry = HistoryRecord(timestamp, number, message, status, error if error else "").to_dict()
+            if latency is not None:
+                entry["latency"] = round(latency, 1)
+            position = self.history.append(entry)
+            self.stats.record(entry, position)
             self.update_history_view()
         except Exception as e:
             logging.error(f"Error saving history: {str(e)}")
@@ -154,10 +175,26 @@ class PERSONAutomator:
             logging.error(f"Test send failed: {error}")
             return
         _, _, _, _, _, number, message = inputs
+        try:
+            attachment = self.attachment_path()
+        except (OSError, ValueError) as e:
+            self.show_alert(f"Invalid image: {str(e)}", ft.colors.RED_400)
+            logging.error(f"Test send failed: {str(e)}")
+            return
+        if self.scheduler_process is not None and self.scheduler_process.is_alive():
+            # Let the scheduler own the browser so the test send jumps ahead of queued batches.
+            self.send_inbox.put({"number": number, "message": message, "priority": "interactive", "attachment": attachment})
+            self.show_alert("Test message queued ahead of scheduled messages.", ft.colors.BLUE_400)
+            logging.info(f"Test message for {number} queued in interactive lane")
+            return
         try:
             logging.info(f"Test sending message to {number}")
-            kit.sendwhatmsg_instantly(number, message, wait_time=40, tab_close=True)
-            self.save_history(number, message, "Success")
+            started = datetime.now()
+            if attachment:
+                kit.sendwhats_image(number, attachment, caption=message, wait_time=40, tab_close=True)
+            else:
+                kit.sendwhatmsg_instantly(number, message, wait_time=40, tab_close=True)
+            self.save_history(number, message, "Success", latency=(datetime.now() - started).total_seconds())
             self.show_alert("Test message sent successfully!", ft.colors.GREEN_400)
             self.show_notification("PERSON Automator", "Test message sent successfully!")
             logging.info(f"Test message sent successfully to {number}")
@@ -167,6 +204,14 @@ class PERSONAutomator:
             self.show_notification("PERSON Automator", f"Failed to send test message: {str(e)}")
             logging.error(f"Test send failed to {number}: {str(e)}")
 
+    def attachment_path(self):
+        path = (self.attachment_field.value or "").strip()
+        if not path:
+            return None
+        if not os.path.isfile(path):
+            raise ValueError("Attachment must be the path of an existing file.")
+        return cache_attachment(path)
+
     def show_alert(self, message, color):
         self.page.snack_bar = ft.SnackBar(
             content=ft.Row([
@@ -196,24 +241,13 @@ class PERSONAutomator:
             return
         day, month, year, hour, minute, number, message = inputs
         try:
-            schedule_data = {
-                "number": number,
-                "message": message,
-                "day": day,
-                "month": month,
-                "year": year,
-                "hour": hour,
-                "minute": minute,
-                "active": True
-            }
-            with open(self.schedule_file, "w") as f:
-                json.dump(schedule_data, f, indent=2)
+            self.store_schedule(inputs)
             self.save_settings()
             self.show_alert(f"Message scheduled for {year}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}.", ft.colors.BLUE_400)
             self.show_notification("PERSON Automator", f"Message scheduled for {year}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}.")
             logging.info(f"Message scheduled for {number} at {year}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}")
-            if not hasattr(self, "scheduler_process") or not self.scheduler_process.is_alive():
-                self.scheduler_process = multiprocessing.Process(target=run_scheduler, args=(self.schedule_file,))
+            if self.scheduler_process is None or not self.scheduler_process.is_alive():
+                self.scheduler_process = multiprocessing.Process(target=run_scheduler, args=(self.schedule_file, self.send_inbox))
                 self.scheduler_process.daemon = True
                 self.scheduler_process.start()
                 logging.info("Background scheduler process started")
@@ -221,6 +255,23 @@ class PERSONAutomator:
             self.show_alert(f"Error scheduling message: {str(e)}", ft.colors.RED_400)
             logging.error(f"Error scheduling message: {str(e)}")
 
+    def store_schedule(self, inputs):
+        day, month, year, hour, minute, number, message = inputs
+        job = {
+            "number": number,
+            "message": message,
+            "day": day,
+            "month": month,
+            "year": year,
+            "hour": hour,
+            "minute": minute
+        }
+        if self.attachment_field.value and self.attachment_field.value.strip():
+            job["attachment"] = self.attachment_field.value.strip()
+        # Same message and time map to the same id, so saving twice does not send twice.
+        job["id"] = content_id(job)
+        self.job_store.add_jobs([normalize_job(job)])
+
     def open_PERSON_web(self, e):
         try:
             webbrowser.open("https://web.PERSON.com")
@@ -333,28 +384,106 @@ class PERSONAutomator:
         dialog.open = True
         self.page.update()
 
+    def stats_row(self, label, row):
+        rate = f"{row['success_rate'] * 100:.0f}%" if row["success_rate"] is not None else "-"
+        latency = f"{row['avg_latency']:.0f}s" if row["avg_latency"] is not None else "-"
+        return ft.Row([
+            ft.Text(label, color=ft.colors.WHITE, size=12, expand=2),
+            ft.Text(str(row["total"]), color=ft.colors.GREY_400, size=12, expand=1),
+            ft.Text(rate, color=ft.colors.GREEN_400, size=12, expand=1),
+            ft.Text(latency, color=ft.colors.GREY_400, size=12, expand=1)
+        ])
+
+    def show_stats(self, e):
+        def on_close(e):
+            self.page.dialog.open = False
+            self.page.update()
+
+        def heading(text):
+            return ft.Text(text, color=ft.colors.TEAL_200, weight=ft.FontWeight.W_500)
+
+        try:
+            summary = self.stats.summary(days=STATS_DAYS, top=STATS_TOP)
+        except Exception as e:
+            logging.error(f"Error loading statistics: {str(e)}")
+            self.show_alert(f"Error loading statistics: {str(e)}", ft.colors.RED_400)
+            return
+        latency_peak = max(summary["latency"].values()) or 1
+        controls = [
+            self.stats_row("All messages", summary["overall"]),
+            heading(f"Last {STATS_DAYS} days"),
+            *[self.stats_row(row["key"], row) for row in reversed(summary["days"])],
+            heading("Top recipients"),
+            *[self.stats_row(row["key"], row) for row in summary["top_numbers"]],
+            heading("Delivery latency"),
+            *[
+                ft.Row([
+                    ft.Text(label, color=ft.colors.WHITE, size=12, width=70),
+                    ft.ProgressBar(value=count / latency_peak, color=ft.colors.TEAL_400, bgcolor=ft.colors.GREY_800, expand=True),
+                    ft.Text(str(count), color=ft.colors.GREY_400, size=12, width=50)
+                ])
+                for label, count in summary["latency"].items()
+            ]
+        ]
+        dialog = ft.AlertDialog(
+            title=ft.Row([
+                ft.Icon(ft.icons.INSIGHTS, color=ft.colors.TEAL_400),
+                ft.Text("Send Statistics", color=ft.colors.WHITE, weight=ft.FontWeight.BOLD)
+            ], spacing=10),
+            content=ft.Column(controls, scroll=ft.ScrollMode.AUTO, spacing=6, width=360, height=420),
+            actions=[
+                ft.TextButton("Export CSV", on_click=lambda e: self.export_stats("csv"), style=ft.ButtonStyle(color=ft.colors.TEAL_400)),
+                ft.TextButton("Export JSON", on_click=lambda e: self.export_stats("json"), style=ft.ButtonStyle(color=ft.colors.TEAL_400)),
+                ft.TextButton("Close", on_click=on_close, style=ft.ButtonStyle(color=ft.colors.GREY_400))
+            ],
+            actions_alignment=ft.MainAxisAlignment.END,
+            bgcolor=ft.colors.GREY_900
+        )
+        self.page.dialog = dialog
+        dialog.open = True
+        self.page.update()
+
+    def export_stats(self, fmt):
+        path = f"send_stats.{fmt}"
+        try:
+            count = self.stats.export(path, fmt)
+            self.show_alert(f"Exported {count} statistics rows to {path}.", ft.colors.BLUE_400)
+        except Exception as e:
+            logging.error(f"Error exporting statistics: {str(e)}")
+            self.show_alert(f"Error exporting statistics: {str(e)}", ft.colors.RED_400)
+
+    def history_tile(self, entry):
+        status_color = ft.colors.GREEN_400 if entry.status == "Success" else ft.colors.RED_400
+        status_icon = ft.icons.CHECK_CIRCLE if entry.status == "Success" else ft.icons.ERROR
+        return ft.Container(
+            content=ft.ListTile(
+                leading=ft.Icon(status_icon, color=status_color, size=24),
+                title=ft.Text(f"{entry.timestamp}", color=ft.colors.WHITE, size=12, weight=ft.FontWeight.W_500),
+                subtitle=ft.Text(f"To: {entry.number}\nMessage: {entry.message[:30]}...", color=ft.colors.GREY_400, size=10),
+                trailing=ft.Icon(ft.icons.PERSON, color=ft.colors.GREEN if entry.status == "Success" else ft.colors.RED_400),
+            ),
+            bgcolor=ft.colors.GREY_800,
+            border_radius=10,
+            margin=ft.margin.only(bottom=5),
+            padding=5
+        )
+
     def update_history_view(self):
-        self.history_container.content.controls.clear()
-        for entry in self.history[-5:]:
-            status_color = ft.colors.GREEN_400 if entry["status"] == "Success" else ft.colors.RED_400
-            status_icon = ft.icons.CHECK_CIRCLE if entry["status"] == "Success" else ft.icons.ERROR
-            
-            self.history_container.content.controls.append(
-                ft.Container(
-                    content=ft.ListTile(
-                        leading=ft.Icon(status_icon, color=status_color, size=24),
-                        title=ft.Text(f"{entry['timestamp']}", color=ft.colors.WHITE, size=12, weight=ft.FontWeight.W_500),
-                        subtitle=ft.Text(f"To: {entry['number']}\nMessage: {entry['message'][:30]}...", color=ft.colors.GREY_400, size=10),
-                        trailing=ft.Icon(ft.icons.PERSON, color=ft.colors.GREEN if entry["status"] == "Success" else ft.colors.RED_400),
-                    ),
-                    bgcolor=ft.colors.GREY_800,
-                    border_radius=10,
-                    margin=ft.margin.only(bottom=5),
-                    padding=5
-                )
-            )
+        self.history_list.controls.clear()
+        for entry in self.history.rows():
+            self.history_list.controls.append(self.history_tile(entry))
         self.page.update()
 
+    def load_older_history(self, e):
+        try:
+            if not self.history.load_older():
+                self.show_alert("No older messages.", ft.colors.BLUE_400)
+                return
+            self.update_history_view()
+        except Exception as e:
+            logging.error(f"Error loading older history: {str(e)}")
+            self.show_alert(f"Error loading older history: {str(e)}", ft.colors.RED_400)
+
     def toggle_history_view(self, e):
         self.history_container.visible = not self.history_container.visible
         if self.history_container.visible:
@@ -363,35 +492,28 @@ class PERSONAutomator:
         else:
             e.control.text = "Show History"
             e.control.icon = ft.icons.HISTORY
+            if self.history.older:
+                self.history.collapse()
+                self.update_history_view()
         self.page.update()
 
     def save_and_exit(self, e):
         self.save_settings()
         inputs, error = self.validate_inputs()
         if not error:
-            day, month, year, hour, minute, number, message = inputs
             try:
-                schedule_data = {
-                    "number": number,
-                    "message": message,
-                    "day": day,
-                    "month": month,
-                    "year": year,
-                    "hour": hour,
-                    "minute": minute,
-                    "active": True
-                }
-                with open(self.schedule_file, "w") as f:
-                    json.dump(schedule_data, f, indent=2)
+                self.store_schedule(inputs)
                 logging.info("Schedule saved on exit")
-                if not hasattr(self, "scheduler_process") or not self.scheduler_process.is_alive():
-                    self.scheduler_process = multiprocessing.Process(target=run_scheduler, args=(self.schedule_file,))
+                if self.scheduler_process is None or not self.scheduler_process.is_alive():
+                    self.scheduler_process = multiprocessing.Process(target=run_scheduler, args=(self.schedule_file, self.send_inbox))
                     self.scheduler_process.daemon = True
                     self.scheduler_process.start()
                     logging.info("Background scheduler process started on exit")
             except Exception as e:
                 self.show_alert(f"Error saving schedule on exit: {str(e)}", ft.colors.RED_400)
                 logging.error(f"Error saving schedule on exit: {str(e)}")
+        if self.profiler is not None:
+            self.profiler.save_summary()
         self.page.window.close()
         logging.info("Application closed")
 
@@ -441,6 +563,19 @@ class PERSONAutomator:
             label_style=ft.TextStyle(color=ft.colors.GREY_400)
         )
 
+        self.attachment_field = ft.TextField(
+            label="Image (optional)",
+            hint_text="/path/to/flyer.jpg",
+            prefix_icon=ft.icons.IMAGE,
+            bgcolor=ft.colors.GREY_800,
+            color=ft.colors.WHITE,
+            border_color=ft.colors.GREY_600,
+            focused_border_color=ft.colors.BLUE_400,
+            border_radius=12,
+            text_size=14,
+            label_style=ft.TextStyle(color=ft.colors.GREY_400)
+        )
+
         date_section = ft.Container(
             content=ft.Column([
                 ft.Row([
@@ -643,6 +778,24 @@ class PERSONAutomator:
                         ),
                         expand=1
                     )
+                ], spacing=10),
+                ft.Row([
+                    ft.Container(
+                        content=ft.ElevatedButton(
+                            text="Stats",
+                            icon=ft.icons.INSIGHTS,
+                            on_click=self.show_stats,
+                            style=ft.ButtonStyle(
+                                bgcolor=ft.colors.TEAL_600,
+                                color=ft.colors.WHITE,
+                                shape=ft.RoundedRectangleBorder(radius=12),
+                                elevation=5,
+                                padding=ft.padding.symmetric(vertical=12, horizontal=15)
+                            ),
+                            height=45
+                        ),
+                        expand=1
+                    )
                 ], spacing=10)
             ], spacing=15),
             padding=20
@@ -655,7 +808,13 @@ class PERSONAutomator:
                         ft.Icon(ft.icons.HISTORY, color=ft.colors.PURPLE_400, size=20),
                         ft.Text("Message History", color=ft.colors.WHITE, weight=ft.FontWeight.W_500)
                     ], spacing=8),
-                    ft.Column([], scroll=ft.ScrollMode.AUTO, height=200, spacing=5)
+                    ft.Column([], scroll=ft.ScrollMode.AUTO, height=200, spacing=5),
+                    ft.TextButton(
+                        "Load older",
+                        icon=ft.icons.EXPAND_MORE,
+                        on_click=self.load_older_history,
+                        style=ft.ButtonStyle(color=ft.colors.PURPLE_200)
+                    )
                 ],
                 spacing=10
             ),
@@ -666,6 +825,7 @@ class PERSONAutomator:
             margin=ft.margin.only(top=10, left=20, right=20, bottom=20),
             border=ft.border.all(1, ft.colors.GREY_700)
         )
+        self.history_list = self.history_container.content.controls[1]
         
         self.update_history_view()
 
@@ -676,6 +836,7 @@ class PERSONAutomator:
                     content=ft.Column([
                         self.number_field,
                         self.message_field,
+                        self.attachment_field,
                         date_section,
                         time_section,
                     ], spacing=15),
@@ -699,107 +860,16 @@ class PERSONAutomator:
         
         self.number_field.width = field_width
         self.message_field.width = field_width
+        self.attachment_field.width = field_width
         
         if hasattr(self, 'history_container'):
             self.history_container.width = field_width
         
         self.page.update()
 
-def run_scheduler(schedule_file):
-    import schedule
-    import pywhatkit
-    import json
-    import time
-    import logging
-    from datetime import datetime
-
-    logging.basicConfig(
-        filename="scheduler.log",
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s"
-    )
-
-    def load_schedule():
-        try:
-            if os.path.exists(schedule_file):
-                with open(schedule_file, "r") as f:
-                    return json.load(f)
-        except Exception as e:
-            logging.error(f"Error loading schedule: {str(e)}")
-        return {}
-
-    def load_history(history_file):
-        try:
-            if os.path.exists(history_file):
-                with open(history_file, "r") as f:
-                    return json.load(f)
-        except Exception as e:
-            logging.error(f"Error loading history: {str(e)}")
-        return []
-
-    def send_PERSON(number, message, hour, minute):
-        try:
-            logging.info(f"Attempting to send message to {number} at {hour:02d}:{minute:02d}")
-            pywhatkit.sendwhatmsg(number, message, hour, minute, wait_time=40, tab_close=True)
-            logging.info(f"Message sent successfully to {number}")
-            history_file = "send_history.json"
-            history = load_history(history_file)
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            history.append({
-                "timestamp": timestamp,
-                "number": number,
-                "message": message,
-                "status": "Success",
-                "error": ""
-            })
-            with open(history_file, "w") as f:
-                json.dump(history, f, indent=2)
-        except Exception as e:
-            logging.error(f"Failed to send message to {number}: {str(e)}")
-            history_file = "send_history.json"
-            history = load_history(history_file)
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            history.append({
-                "timestamp": timestamp,
-                "number": number,
-                "message": message,
-                "status": "Failed",
-                "error": str(e)
-            })
-            with open(history_file, "w") as f:
-                json.dump(history, f, indent=2)
-
-    def check_schedule():
-        schedule_data = load_schedule()
-        if not schedule_data.get("active"):
-            return
-        try:
-            year = int(schedule_data.get("year"))
-            month = int(schedule_data.get("month"))
-            day = int(schedule_data.get("day"))
-            hour = int(schedule_data.get("hour"))
-            minute = int(schedule_data.get("minute"))
-            number = schedule_data.get("number")
-            message = schedule_data.get("message")
-            schedule_time = datetime(year, month, day, hour, minute)
-            now = datetime.now()
-            if now.year == year and now.month == month and now.day == day:
-                schedule.every().day.at(f"{hour:02d}:{minute:02d}").do(
-                    send_PERSON, number, message, hour, minute
-                )
-                logging.info(f"Scheduled message for {number} at {year}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}")
-            if now >= schedule_time:
-                schedule_data["active"] = False
-                with open(schedule_file, "w") as f:
-                    json.dump(schedule_data, f, indent=2)
-                logging.info("Schedule deactivated after sending")
-        except Exception as e:
-            logging.error(f"Error in scheduler: {str(e)}")
-
-    schedule.every(60).seconds.do(check_schedule)
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+def run_scheduler(schedule_file, inbox=None):
+    import scheduler
+    scheduler.main(schedule_file, inbox)
 
 def main(page: ft.Page):
     logging.info("Application started")
@@ -0,0 +1,263 @@
+import codecs
+import json
+import os
+import re
+import struct
+import time
+from collections import deque
+from contextlib import contextmanager
+
+HISTORY_FILE = "send_history.json"
+CHUNK_SIZE = 64 * 1024
+LOCK_TIMEOUT = 10
+SEPARATORS = re.compile(r"[\s,]*")
+OFFSET = struct.Struct("<Q")
+
+
+class HistoryRecord:
+    __slots__ = ("timestamp", "number", "message", "status", "error")
+
+    def __init__(self, timestamp, number, message, status, error=""):
+        self.timestamp = timestamp
+        self.number = number
+        self.message = message
+        self.status = status
+        self.error = error
+
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(entry.get("timestamp", ""), entry.get("number", ""), entry.get("message", ""),
+                   entry.get("status", ""), entry.get("error", ""))
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+@contextmanager
+def file_lock(path):
+    lock_path = path + ".lock"
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                # The holder most likely died; take the lock over.
+                os.remove(lock_path)
+                deadline = time.monotonic() + LOCK_TIMEOUT
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+
+def append_entry(history_file, entry):
+    # Appends in place before the closing bracket instead of re-dumping the whole list.
+    # Returns the number of entries in the file, so the new entry's position is that minus one.
+    item = ("\n".join("  " + line for line in json.dumps(entry, indent=2).splitlines())).encode("utf-8")
+    with file_lock(history_file):
+        if not os.path.exists(history_file) or os.path.getsize(history_file) == 0:
+            with open(history_file, "wb") as f:
+                f.write(b"[\n" + item + b"\n]")
+            with open(index_path(history_file), "wb") as f:
+                f.write(OFFSET.pack(2))
+            return 1
+        count = ensure_index(history_file)
+        with open(history_file, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            closed = False
+            while position > 0:
+                step = min(CHUNK_SIZE, position)
+                position -= step
+                f.seek(position)
+                tail = f.read(step).rstrip()
+                if not tail:
+                    continue
+                if not closed:
+                    if not tail.endswith(b"]"):
+                        break
+                    closed = True
+                    tail = tail[:-1].rstrip()
+                    if not tail:
+                        continue
+                f.seek(position + len(tail))
+                f.truncate()
+                separator = b"\n" if tail.endswith(b"[") else b",\n"
+                f.write(separator + item + b"\n]")
+                with open(index_path(history_file), "ab") as index:
+                    index.write(OFFSET.pack(position + len(tail) + len(separator)))
+                return count + 1
+        raise ValueError(f"{history_file} is not a JSON list")
+
+
+def scan_entries(history_file):
+    # Streams (byte offset, entry) pairs so memory stays bounded by the chunk size.
+    if not os.path.exists(history_file):
+        return
+    decoder = json.JSONDecoder()
+    with open(history_file, "r", encoding="utf-8", newline="") as f:
+        buffer = f.read(CHUNK_SIZE)
+        position = SEPARATORS.match(buffer, 0).end()
+        if not buffer.startswith("[", position):
+            raise ValueError(f"{history_file} is not a JSON list")
+        position += 1
+        offset = mark = 0
+        while True:
+            position = SEPARATORS.match(buffer, position).end()
+            if buffer.startswith("]", position):
+                return
+            try:
+                entry, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                offset += len(buffer[mark:position].encode("utf-8"))
+                buffer = buffer[position:] + chunk
+                position = mark = 0
+                continue
+            offset += len(buffer[mark:position].encode("utf-8"))
+            mark = position
+            yield offset, entry
+            position = end
+
+
+def iter_entries(history_file):
+    for _, entry in scan_entries(history_file):
+        yield entry
+
+
+def index_path(history_file):
+    return history_file + ".idx"
+
+
+def read_entry_at(f, offset):
+    # Decodes the entry starting at a byte offset; returns it with the byte offset just past it.
+    decoder = json.JSONDecoder()
+    size = 4096
+    while True:
+        f.seek(offset)
+        data = f.read(size)
+        text = codecs.getincrementaldecoder("utf-8")().decode(data)
+        try:
+            entry, end = decoder.raw_decode(text)
+            return entry, offset + len(text[:end].encode("utf-8"))
+        except json.JSONDecodeError:
+            if len(data) < size:
+                raise
+            size *= 4
+
+
+def index_is_current(history_file, count):
+    if not os.path.exists(history_file):
+        return count == 0
+    with open(history_file, "rb") as f:
+        if count == 0:
+            return b"{" not in f.read(CHUNK_SIZE)
+        with open(index_path(history_file), "rb") as index:
+            index.seek((count - 1) * OFFSET.size)
+            offset, = OFFSET.unpack(index.read(OFFSET.size))
+        f.seek(offset)
+        if f.read(1) != b"{":
+            return False
+        try:
+            _, end = read_entry_at(f, offset)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return False
+        f.seek(end)
+        # Nothing but the closing bracket may follow the last indexed entry.
+        return f.read(CHUNK_SIZE).strip(b", \t\r\n") == b"]"
+
+
+def ensure_index(history_file):
+    # Caller holds the file lock. The index holds one byte offset per entry so pages can be read
+    # without scanning the list; it is rebuilt if missing or out of step with the file.
+    if not os.path.exists(history_file):
+        return 0
+    path = index_path(history_file)
+    size = os.path.getsize(path) if os.path.exists(path) else -1
+    if size >= 0 and size % OFFSET.size == 0 and index_is_current(history_file, size // OFFSET.size):
+        return size // OFFSET.size
+    count = 0
+    with open(path + ".tmp", "wb") as index:
+        for offset, _ in scan_entries(history_file):
+            index.write(OFFSET.pack(offset))
+            count += 1
+    os.replace(path + ".tmp", path)
+    return count
+
+
+def entry_count(history_file):
+    with file_lock(history_file):
+        return ensure_index(history_file)
+
+
+def read_tail(history_file, limit):
+    # Returns the newest `limit` records and how many entries the file held at that moment.
+    count = entry_count(history_file)
+    return deque(read_before(history_file, count, limit), maxlen=limit), count
+
+
+def read_before(history_file, stop, limit):
+    # Returns up to `limit` records whose position in the file is just below `stop`, oldest first.
+    # Positions never shift because the file is only appended to.
+    stop = min(stop, entry_count(history_file))
+    start = max(0, stop - limit)
+    if stop <= start:
+        return []
+    with open(index_path(history_file), "rb") as index:
+        index.seek(start * OFFSET.size)
+        offsets = [offset for offset, in OFFSET.iter_unpack(index.read((stop - start) * OFFSET.size))]
+    with open(history_file, "rb") as f:
+        return [HistoryRecord.from_dict(read_entry_at(f, offset)[0]) for offset in offsets]
+
+
+class HistoryWindow:
+    """The rows the app shows: the newest few in a ring buffer plus older pages read on demand.
+
+    Each row keeps its position in the file, so paging stays aligned while other
+    processes append to the same history.
+    """
+
+    def __init__(self, history_file, shown, page):
+        self.history_file = history_file
+        self.page = page
+        self.recent = deque(maxlen=shown)
+        self.positions = deque(maxlen=shown)
+        self.older = []
+        self.older_start = 0
+        self.total = 0
+
+    def load(self):
+        records, self.total = read_tail(self.history_file, self.recent.maxlen)
+        self.recent.extend(records)
+        self.positions.extend(range(self.total - len(records), self.total))
+
+    def append(self, entry):
+        position = append_entry(self.history_file, entry) - 1
+        if len(self.recent) == self.recent.maxlen and self.older:
+            # Keep the expanded view contiguous instead of dropping a row from its middle.
+            self.older.append(self.recent[0])
+        self.recent.append(HistoryRecord.from_dict(entry))
+        self.positions.append(position)
+        return position
+
+    def load_older(self):
+        if self.older:
+            stop = self.older_start
+        else:
+            stop = self.positions[0] if self.positions else self.total
+        older = read_before(self.history_file, stop, self.page)
+        self.older_start = stop - len(older)
+        self.older = older + self.older
+        return len(older)
+
+    def collapse(self):
+        self.older = []
+
+    def rows(self):
+        return self.older + list(self.recent)
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import logging
+import time
+from job_store import JobStore, normalize_job
+from scheduler import load_settings
+
+MAX_BODY = 8 * 1024 * 1024
+BATCH_SIZE = 500
+BATCH_DELAY = 0.005
+BACKLOG_REFRESH = 1.0
+REASONS = {
+    200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    409: "Conflict", 413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error"
+}
+
+
+class Backpressure(Exception):
+    pass
+
+
+class IngestServer:
+    """Asyncio HTTP front end for the job store.
+
+    Enqueue requests are buffered for a few milliseconds and committed together
+    in one transaction; each request is answered only after its commit.
+    """
+
+    def __init__(self, store, high_water=10000):
+        self.store = store
+        self.high_water = high_water
+        self.buffer = []
+        self.buffered = 0
+        self.flush_handle = None
+        self.backlog = store.pending_count()
+        self.backlog_checked = time.monotonic()
+
+    def refresh_backlog(self):
+        # The scheduler drains the store behind our back, so the cached count goes stale.
+        if time.monotonic() - self.backlog_checked > BACKLOG_REFRESH:
+            self.backlog = self.store.pending_count()
+            self.backlog_checked = time.monotonic()
+
+    async def enqueue(self, jobs):
+        if self.backlog + self.buffered + len(jobs) > self.high_water:
+            self.refresh_backlog()
+        if self.backlog + self.buffered + len(jobs) > self.high_water:
+            raise Backpressure()
+        future = asyncio.get_running_loop().create_future()
+        self.buffer.append((jobs, future))
+        self.buffered += len(jobs)
+        if self.buffered >= BATCH_SIZE:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(BATCH_DELAY, self.flush)
+        return await future
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.buffer, self.buffered = self.buffer, [], 0
+        if not batch:
+            return
+        try:
+            outcomes = self.store.insert_jobs([job for jobs, _ in batch for job in jobs])
+        except Exception as e:
+            logging.error(f"Error writing {len(batch)} enqueue requests: {str(e)}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.backlog += outcomes.count("created")
+        self.refresh_backlog()
+        start = 0
+        for jobs, future in batch:
+            future.set_result([(job["id"], outcome) for job, outcome in zip(jobs, outcomes[start:start + len(jobs)])])
+            start += len(jobs)
+
+    async def route(self, method, path, body):
+        parts = [part for part in path.split("?")[0].split("/") if part]
+        if parts == ["jobs"] and method == "POST":
+            [(job_id, outcome)] = await self.enqueue([normalize_job(json.loads(body))])
+            if outcome == "conflict":
+                return 409, {"error": "Another job already uses this id.", "id": job_id}
+            # Re-posting the same job is harmless; it is reported but not stored twice.
+            return (201 if outcome == "created" else 200), {"id": job_id}
+        if parts == ["jobs", "bulk"] and method == "POST":
+            payload = json.loads(body)
+            jobs = payload.get("jobs") if isinstance(payload, dict) else payload
+            if not isinstance(jobs, list) or not jobs:
+                raise ValueError("Bulk body must be a non-empty list of jobs.")
+            results = await self.enqueue([normalize_job(job) for job in jobs])
+            payload = {"ids": [job_id for job_id, outcome in results if outcome != "conflict"]}
+            conflicts = [job_id for job_id, outcome in results if outcome == "conflict"]
+            if conflicts:
+                payload["conflicts"] = conflicts
+            return (201 if payload["ids"] else 409), payload
+        if len(parts) == 2 and parts[0] == "jobs" and method == "GET":
+            job = self.store.get(parts[1])
+            return (200, job) if job else (404, {"error": "Job not found."})
+        if len(parts) == 2 and parts[0] == "jobs" and method == "DELETE":
+            if self.store.cancel(parts[1]):
+                return 200, {"id": parts[1], "status": "cancelled"}
+            job = self.store.get(parts[1])
+            if not job:
+                return 404, {"error": "Job not found."}
+            return 409, {"error": f"Job is already {job['status']}."}
+        if parts == ["health"] and method == "GET":
+            self.refresh_backlog()
+            return 200, {"pending": self.backlog, "buffered": self.buffered, "high_water": self.high_water}
+        if parts and parts[0] in ("jobs", "health"):
+            return 405, {"error": "Method not allowed."}
+        return 404, {"error": "Not found."}
+
+    async def respond(self, method, path, body):
+        try:
+            return await self.route(method, path, body)
+        except Backpressure:
+            return 429, {"error": "Queue is above its high-water mark, retry later."}
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            logging.error(f"Error handling {method} {path}: {str(e)}")
+            return 500, {"error": "Internal error."}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY:
+                    writer.write(self.encode(413, {"error": "Body too large."}, False))
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self.respond(method, path, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write(self.encode(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def encode(self, status, payload, keep_alive):
+        body = json.dumps(payload).encode("utf-8")
+        headers = [
+            f"HTTP/1.1 {status} {REASONS[status]}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"
+        ]
+        if status == 429:
+            headers.append("Retry-After: 1")
+        return ("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body
+
+
+async def serve(settings):
+    server = IngestServer(JobStore(settings["job_store"]), settings["high_water"])
+    listener = await asyncio.start_server(server.handle, settings["api_host"], settings["api_port"])
+    logging.info(f"Ingestion API listening on {settings['api_host']}:{settings['api_port']}")
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(settings_file="scheduler_settings.json"):
+    asyncio.run(serve(load_settings(settings_file)))
+
+
+if __name__ == "__main__":
+    main()
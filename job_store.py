@@ -0,0 +1,285 @@
+import hashlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from media_cache import cache_attachment
+from send_queue import LANES
+
+DUE_FORMAT = "%Y-%m-%d %H:%M:%S"
+CONTENT_FIELDS = ("number", "message", "due", "priority", "campaign", "attachment")
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    number TEXT NOT NULL,
+    message TEXT NOT NULL,
+    due TEXT NOT NULL,
+    priority TEXT NOT NULL DEFAULT 'scheduled',
+    campaign TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    error TEXT NOT NULL DEFAULT '',
+    created TEXT NOT NULL,
+    updated TEXT NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    attachment TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_due ON jobs (status, due);
+CREATE INDEX IF NOT EXISTS jobs_priority_status_due ON jobs (priority, status, due);
+CREATE INDEX IF NOT EXISTS jobs_number_status_due ON jobs (number, status, due);
+"""
+ADDED_COLUMNS = {"lease_owner": "TEXT", "lease_expires": "REAL", "attachment": "TEXT"}
+LEASE_SECONDS = 120
+# Stays well under SQLite's limit on bound parameters per statement.
+NUMBERS_PER_QUERY = 500
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def job_time(job):
+    if job.get("due"):
+        due = job["due"]
+        for fmt in (DUE_FORMAT, "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M"):
+            try:
+                return datetime.strptime(due, fmt)
+            except ValueError:
+                pass
+        raise ValueError(f"Invalid due time: {due}")
+    return datetime(int(job["year"]), int(job["month"]), int(job["day"]), int(job["hour"]), int(job["minute"]))
+
+
+def content_id(job):
+    key = f"{job['number']}|{job_time(job):{DUE_FORMAT}}|{job['message']}"
+    if job.get("attachment"):
+        key += f"|{job['attachment']}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+def normalize_job(job):
+    if not isinstance(job, dict):
+        raise ValueError("Job must be an object.")
+    number = job.get("number")
+    message = job.get("message")
+    priority = job.get("priority") or "scheduled"
+    campaign = job.get("campaign")
+    if not isinstance(number, str) or not number.startswith("+") or not number[1:].isdigit():
+        raise ValueError("Number must start with + followed by digits.")
+    if not isinstance(message, str) or not message.strip():
+        raise ValueError("Message cannot be empty.")
+    if priority not in LANES:
+        raise ValueError(f"Priority must be one of: {', '.join(LANES)}.")
+    if campaign is not None and not isinstance(campaign, str):
+        raise ValueError("Campaign must be a string.")
+    attachment = job.get("attachment")
+    if attachment is not None:
+        if not isinstance(attachment, str) or not os.path.isfile(attachment):
+            raise ValueError("Attachment must be the path of an existing file.")
+        try:
+            attachment = cache_attachment(attachment)
+        except OSError as e:
+            raise ValueError(f"Could not prepare attachment: {str(e)}")
+    try:
+        due = job_time(job)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Due must be 'YYYY-MM-DD HH:MM' or year/month/day/hour/minute.")
+    return {
+        "id": str(job.get("id") or uuid.uuid4().hex),
+        "number": number,
+        "message": message,
+        "due": due.strftime(DUE_FORMAT),
+        "priority": priority,
+        "campaign": campaign,
+        "attachment": attachment
+    }
+
+
+class JobStore:
+    """SQLite job store shared by the scheduler, the app and the ingestion API.
+
+    Scheduler workers claim due jobs under time-limited leases. A worker keeps
+    its leases alive with heartbeats; if it dies, the leases expire and another
+    worker reclaims the jobs on its next claim.
+    """
+
+    def __init__(self, path="jobs.db", worker_id=None, lease_seconds=LEASE_SECONDS):
+        self.path = path
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        for name, kind in ADDED_COLUMNS.items():
+            if name not in columns:
+                self.conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def add_jobs(self, jobs):
+        self.insert_jobs(jobs)
+        return [job["id"] for job in jobs]
+
+    def insert_jobs(self, jobs):
+        # One outcome per job: "created", "exists" when the same content is already stored under
+        # that id, or "conflict" when the id is taken by a different job (which is left untouched).
+        # A cancelled job frees its id, so cancel + re-post is how a client reschedules.
+        now = datetime.now().strftime(DUE_FORMAT)
+        outcomes = []
+        with self.transaction() as conn:
+            for job in jobs:
+                content = tuple(job.get(field) for field in CONTENT_FIELDS)
+                row = conn.execute(
+                    f"SELECT status, {', '.join(CONTENT_FIELDS)} FROM jobs WHERE id = ?", (job["id"],)
+                ).fetchone()
+                if row is not None and row["status"] != "cancelled":
+                    outcomes.append("exists" if tuple(row)[1:] == content else "conflict")
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO jobs (id, number, message, due, priority, campaign, attachment, created, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job["id"],) + content + (now, now)
+                )
+                outcomes.append("created")
+        return outcomes
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def cancel(self, job_id):
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', updated = ? WHERE id = ? AND status = 'pending'",
+                (datetime.now().strftime(DUE_FORMAT), job_id)
+            )
+        return cursor.rowcount > 0
+
+    def pending_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'pending'").fetchone()[0]
+
+    def pending(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM jobs WHERE status = 'pending' ORDER BY due").fetchall()
+        return [dict(row) for row in rows]
+
+    def claim_due(self, now, limit):
+        # Pending jobs that are due, plus jobs whose previous owner let the lease lapse.
+        # Claimed lane by lane so a due bulk backlog cannot hold interactive jobs in the store.
+        lease_expires = time.time() + self.lease_seconds
+        rows = []
+        with self.transaction() as conn:
+            for lane in LANES:
+                remaining = limit - len(rows) if limit >= 0 else -1
+                if remaining == 0:
+                    break
+                rows += conn.execute(
+                    "SELECT * FROM jobs WHERE priority = ? AND ((status = 'pending' AND due <= ?) "
+                    "OR (status = 'queued' AND lease_expires < ?)) ORDER BY due LIMIT ?",
+                    (lane, now.strftime(DUE_FORMAT), time.time(), remaining)
+                ).fetchall()
+            self.lease(conn, rows, lease_expires)
+        return [dict(row) for row in rows]
+
+    def take_pending_for(self, numbers, until):
+        lease_expires = time.time() + self.lease_seconds
+        numbers = list(numbers)
+        with self.transaction() as conn:
+            rows = []
+            for i in range(0, len(numbers), NUMBERS_PER_QUERY):
+                chunk = numbers[i:i + NUMBERS_PER_QUERY]
+                rows += conn.execute(
+                    f"SELECT * FROM jobs WHERE number IN ({', '.join('?' * len(chunk))}) "
+                    "AND status = 'pending' AND due <= ? ORDER BY due",
+                    chunk + [until.strftime(DUE_FORMAT)]
+                ).fetchall()
+            self.lease(conn, rows, lease_expires)
+        return [dict(row) for row in rows]
+
+    def lease(self, conn, rows, lease_expires):
+        for row in rows:
+            if row["status"] == "queued":
+                logging.warning(f"Reclaiming job {row['id']} from expired lease of {row['lease_owner']}")
+        conn.executemany(
+            "UPDATE jobs SET status = 'queued', lease_owner = ?, lease_expires = ?, updated = ? WHERE id = ?",
+            [(self.worker_id, lease_expires, datetime.now().strftime(DUE_FORMAT), row["id"]) for row in rows]
+        )
+
+    def heartbeat(self):
+        # A lapsed lease is not revived: the job may already be claimed again elsewhere.
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE status = 'queued' AND lease_owner = ? AND lease_expires >= ?",
+                (time.time() + self.lease_seconds, self.worker_id, time.time())
+            )
+        return cursor.rowcount
+
+    def renew(self, job_ids):
+        # Right before sending: fails if any lease lapsed and the job may belong to another worker now.
+        with self.transaction() as conn:
+            renewed = 0
+            for job_id in job_ids:
+                renewed += conn.execute(
+                    "UPDATE jobs SET lease_expires = ? WHERE id = ? AND status = 'queued' "
+                    "AND lease_owner = ? AND lease_expires >= ?",
+                    (time.time() + self.lease_seconds, job_id, self.worker_id, time.time())
+                ).rowcount
+        return renewed == len(job_ids)
+
+    def release(self, job_ids):
+        # Hands back jobs this worker still holds so any worker can claim them again.
+        with self.transaction() as conn:
+            released = 0
+            for job_id in job_ids:
+                released += conn.execute(
+                    "UPDATE jobs SET status = 'pending', lease_owner = NULL, lease_expires = NULL "
+                    "WHERE id = ? AND status = 'queued' AND lease_owner = ?",
+                    (job_id, self.worker_id)
+                ).rowcount
+        return released
+
+    def mark(self, job_ids, status, error=""):
+        now = datetime.now().strftime(DUE_FORMAT)
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE jobs SET status = ?, error = ?, updated = ?, lease_owner = NULL, lease_expires = NULL "
+                "WHERE id = ?",
+                [(status, error, now, job_id) for job_id in job_ids]
+            )
+
+    def reschedule(self, job_id, due):
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'pending', due = ?, updated = ?, lease_owner = NULL, lease_expires = NULL "
+                "WHERE id = ?",
+                (due.strftime(DUE_FORMAT), datetime.now().strftime(DUE_FORMAT), job_id)
+            )
+
+    def release_leases(self):
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'pending', lease_owner = NULL, lease_expires = NULL "
+                "WHERE status = 'queued' AND lease_owner = ?",
+                (self.worker_id,)
+            )
+        return cursor.rowcount
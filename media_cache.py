@@ -0,0 +1,68 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+CACHE_DIR = "media_cache"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif")
+MAX_SIDE = 1600
+JPEG_QUALITY = 85
+
+_known = {}
+_lock = threading.Lock()
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_image(path):
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def preprocess_image(source, target):
+    if Image is None:
+        shutil.copyfile(source, target)
+        return
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((MAX_SIDE, MAX_SIDE))
+        image.convert("RGB").save(target, "JPEG", quality=JPEG_QUALITY, optimize=True)
+
+
+def cache_attachment(path, cache_dir=CACHE_DIR):
+    """Returns the cached, send-ready copy of `path`, preparing it only once per content hash."""
+    if not is_image(path):
+        raise ValueError("Only image attachments can be sent through WhatsApp Web automation.")
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, os.path.abspath(cache_dir))
+    with _lock:
+        if key in _known and os.path.exists(_known[key]):
+            return _known[key]
+    digest = file_digest(path)
+    extension = ".jpg" if Image is not None else os.path.splitext(path)[1].lower()
+    # Absolute, because the path is stored in jobs.db and read by processes started elsewhere.
+    cached = os.path.abspath(os.path.join(cache_dir, digest + extension))
+    if not os.path.exists(cached):
+        os.makedirs(cache_dir, exist_ok=True)
+        partial = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            preprocess_image(path, partial)
+            os.replace(partial, cached)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        logging.info(f"Cached attachment {path} as {cached}")
+    with _lock:
+        _known[key] = cached
+    return cached
@@ -1,9 +1,18 @@
 import schedule
-import pywhatkit
 import json
+import os
 import time
 import logging
-from datetime import datetime
+import threading
+import queue
+import webbrowser
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from accounts import Account, Sharder
+from history import HISTORY_FILE, append_entry
+from send_stats import STATS_FILE, SendStats
+from send_queue import LANES, RateLimiter
+from job_store import JobStore, content_id, job_time, normalize_job
 
 logging.basicConfig(
     filename="scheduler.log",
@@ -11,6 +20,44 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
+CHECK_INTERVAL = 15
+LATE_AFTER = timedelta(minutes=2)
+# A gap this long between checks means the process was suspended, not just busy.
+SUSPEND_GAP = timedelta(seconds=CHECK_INTERVAL * 4)
+CATCH_UP_POLICIES = ("send_late", "skip", "reschedule")
+DEFAULT_SETTINGS = {
+    "rate_per_minute": 0,
+    "burst": 1,
+    "weights": {},
+    "accounts": [{"name": "default"}],
+    "job_store": "jobs.db",
+    "stats_file": STATS_FILE,
+    "api_host": "127.0.0.1",
+    "api_port": 8765,
+    "high_water": 10000,
+    "catch_up": "send_late",
+    "catch_up_grace_minutes": 60,
+    "catch_up_per_minute": 2,
+    "catch_up_burst": 3,
+    "coalesce_window_minutes": 0,
+    "coalesce_separator": "\n\n",
+    "coalesce_max_length": 1000,
+    "worker_id": None,
+    "lease_seconds": 120,
+    "claim_batch": 10
+}
+ui_lock = threading.Lock()
+
+def load_settings(settings_file):
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        if os.path.exists(settings_file):
+            with open(settings_file, "r") as f:
+                settings.update(json.load(f))
+    except Exception as e:
+        logging.error(f"Error loading scheduler settings: {str(e)}")
+    return settings
+
 def load_schedule(schedule_file):
     try:
         if os.path.exists(schedule_file):
@@ -20,80 +67,346 @@ def load_schedule(schedule_file):
         logging.error(f"Error loading schedule: {str(e)}")
     return {}
 
-def load_history(history_file):
+def save_history_entry(number, message, status, error="", latency=None, stats=None):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    entry = {
+        "timestamp": timestamp,
+        "number": number,
+        "message": message,
+        "status": status,
+        "error": error
+    }
+    if latency is not None:
+        entry["latency"] = round(latency, 1)
     try:
-        if os.path.exists(history_file):
-            with open(history_file, "r") as f:
-                return json.load(f)
+        position = append_entry(HISTORY_FILE, entry) - 1
     except Exception as e:
-        logging.error(f"Error loading history: {str(e)}")
-    return []
+        logging.error(f"Error saving history: {str(e)}")
+        return
+    if stats is not None:
+        try:
+            stats.record(entry, position)
+        except Exception as e:
+            logging.error(f"Error updating send statistics: {str(e)}")
 
-def send_whatsapp(number, message, hour, minute):
+@contextmanager
+def use_browser(browser):
+    # pywhatkit always opens the default browser; point it at the account's profile instead.
+    # This patches module globals, so callers must hold ui_lock.
+    import pywhatkit.whats
+    import pywhatkit.core.core
+    if not browser:
+        yield
+        return
+    controller = webbrowser.get(browser)
+    saved = pywhatkit.whats.web, pywhatkit.core.core.open
+    pywhatkit.whats.web = controller
+    pywhatkit.core.core.open = controller.open
     try:
-        logging.info(f"Attempting to send message to {number} at {hour:02d}:{minute:02d}")
-        pywhatkit.sendwhatmsg(number, message, hour, minute, wait_time=40, tab_close=True)
-        logging.info(f"Message sent successfully to {number}")
-        history_file = "send_history.json"
-        history = load_history(history_file)
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        history.append({
-            "timestamp": timestamp,
-            "number": number,
-            "message": message,
-            "status": "Success",
-            "error": ""
-        })
-        with open(history_file, "w") as f:
-            json.dump(history, f, indent=2)
-    except Exception as e:
-        logging.error(f"Failed to send message to {number}: {str(e)}")
-        history_file = "send_history.json"
-        history = load_history(history_file)
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        history.append({
-            "timestamp": timestamp,
-            "number": number,
-            "message": message,
-            "status": "Failed",
-            "error": str(e)
-        })
-        with open(history_file, "w") as f:
-            json.dump(history, f, indent=2)
+        yield
+    finally:
+        pywhatkit.whats.web, pywhatkit.core.core.open = saved
+
+def send_whatsapp(number, message, browser=None, attachment=None):
+    # Imported here: pywhatkit checks connectivity and grabs the display on import.
+    import pywhatkit
+    logging.info(f"Attempting to send message to {number}")
+    with use_browser(browser):
+        if attachment:
+            pywhatkit.sendwhats_image(number, attachment, caption=message, wait_time=40, tab_close=True)
+        else:
+            pywhatkit.sendwhatmsg_instantly(number, message, wait_time=40, tab_close=True)
+    logging.info(f"Message sent successfully to {number}")
+
+def send_latency(job, started, finished):
+    # Seconds from when the message was due until it went out; direct sends count from dispatch.
+    due = job_time(job) if job.get("due") else started
+    return max(0.0, (finished - due).total_seconds())
+
+def make_sender(store, stats=None):
+    def send(account, job):
+        logging.info(f"Sending message to {job['number']} from account {account.name}")
+        originals = job.get("merged", [job])
+        ids = [original["id"] for original in originals if original.get("id")]
+        if ids and not store.renew(ids):
+            released = store.release(ids)
+            logging.warning(f"Lease on message for {job['number']} expired before sending, "
+                            f"returned {released} still-held messages to pending")
+            return True
+        error = ""
+        started = datetime.now()
+        try:
+            # One keyboard and screen per process, and use_browser swaps pywhatkit's globals:
+            # sends from different accounts must never overlap.
+            with ui_lock:
+                send_whatsapp(job["number"], job["message"], account.browser, job.get("attachment"))
+        except Exception as e:
+            error = str(e)
+            logging.error(f"Failed to send message to {job['number']}: {error}")
+        finished = datetime.now()
+        for original in originals:
+            latency = None if error else send_latency(original, started, finished)
+            save_history_entry(original["number"], original["message"], "Failed" if error else "Success", error, latency, stats)
+        if ids:
+            store.mark(ids, "failed" if error else "sent", error)
+        return not error
+    return send
+
+def build_sharder(settings, store, stats=None):
+    if settings.get("shared_desktop") is False:
+        logging.warning("shared_desktop is no longer supported; run one scheduler per desktop session to send in parallel")
+    accounts = [
+        Account(
+            config["name"],
+            config.get("browser"),
+            config.get("rate_per_minute", settings["rate_per_minute"]),
+            config.get("burst", settings["burst"]),
+            settings["weights"]
+        )
+        for config in settings["accounts"]
+    ]
+    return Sharder(accounts, make_sender(store, stats))
+
+def schedule_entries(schedule_data):
+    if "jobs" in schedule_data:
+        return schedule_data["jobs"]
+    return [schedule_data]
+
+def collect_due(jobs, now, awake_since=None):
+    # Late means due while no worker was running: before this one woke up, or
+    # leased by a worker that died. A backlog that takes a while to drain is not late.
+    due = []
+    late = []
+    for job in jobs:
+        try:
+            schedule_time = job_time(job)
+        except Exception as e:
+            logging.error(f"Invalid scheduled message: {str(e)}")
+            continue
+        if now < schedule_time:
+            continue
+        reclaimed = job.get("status") == "queued"
+        missed_while_down = awake_since is not None and schedule_time < awake_since
+        if (reclaimed or missed_while_down) and now - schedule_time > LATE_AFTER:
+            late.append(job)
+        else:
+            due.append(job)
+    return due, late
+
+def catch_up_policy(settings):
+    policy = settings["catch_up"]
+    if policy not in CATCH_UP_POLICIES:
+        logging.error(f"Unknown catch-up policy {policy}, using skip")
+        return "skip"
+    return policy
 
-def check_schedule():
-    schedule_file = "schedule.json"
+def catch_up_action(policy, lateness, grace):
+    # What to do with one overdue job: "send" it late, "reschedule" it, or count it as "missed".
+    if policy != "skip" and lateness <= grace:
+        return "send"
+    if policy == "reschedule":
+        return "reschedule"
+    return "missed"
+
+class CatchUp:
+    """Applies the catch-up policy to jobs found overdue, e.g. after downtime.
+
+    Jobs sent late are fed to the sharder at a limited burst rate so a backlog
+    of overdue jobs does not stampede the accounts' queues on restart.
+    """
+
+    def __init__(self, target, store, settings):
+        self.target = target
+        self.store = store
+        self.policy = catch_up_policy(settings)
+        self.grace = timedelta(minutes=settings["catch_up_grace_minutes"])
+        self.limiter = RateLimiter(settings["catch_up_per_minute"], settings["catch_up_burst"])
+        self.backlog = queue.Queue()
+        self.awake_since = datetime.now()
+        self.last_check = None
+
+    def observe(self, now):
+        if self.last_check is not None and now - self.last_check > SUSPEND_GAP:
+            logging.warning(f"No schedule check since {self.last_check:%Y-%m-%d %H:%M:%S}, treating the gap as downtime")
+            self.awake_since = now
+        self.last_check = now
+
+    def handle(self, late, now):
+        missed = []
+        for job in late:
+            lateness = now - job_time(job)
+            action = catch_up_action(self.policy, lateness, self.grace)
+            if action == "send":
+                self.backlog.put(job)
+                logging.info(f"Catching up message for {job['number']} scheduled at {job['due']}")
+            elif action == "reschedule":
+                days = lateness.days + 1
+                due = job_time(job) + timedelta(days=days)
+                self.store.reschedule(job["id"], due)
+                logging.warning(f"Rescheduled overdue message for {job['number']} to {due:%Y-%m-%d %H:%M}")
+            else:
+                missed.append(job)
+                logging.warning(f"Missed message for {job['number']} scheduled at {job['due']}, not sent")
+        if missed:
+            self.store.mark([job["id"] for job in missed], "missed")
+
+    def run(self):
+        while True:
+            job = self.backlog.get()
+            self.limiter.acquire()
+            try:
+                self.target.put(job, job["priority"], job["campaign"])
+            except Exception as e:
+                logging.error(f"Error queueing overdue message: {str(e)}")
+
+def import_schedule_file(store, schedule_file):
     schedule_data = load_schedule(schedule_file)
-    if not schedule_data.get("active"):
+    entries = [job for job in schedule_entries(schedule_data) if job.get("active")]
+    if not entries:
         return
+    jobs = []
+    for job in entries:
+        job["active"] = False
+        try:
+            job.setdefault("id", content_id(job))
+            jobs.append(normalize_job(job))
+        except Exception as e:
+            logging.error(f"Skipping invalid scheduled message: {str(e)}")
+    if jobs:
+        store.add_jobs(jobs)
+        logging.info(f"Imported {len(jobs)} messages from {schedule_file}")
+    with open(schedule_file, "w") as f:
+        json.dump(schedule_data, f, indent=2)
+
+def coalesce(jobs, window, separator, max_length):
+    # Earlier jobs absorb later ones for the same number while within the window and length limit.
+    groups = []
+    open_groups = {}
+    for job in sorted(jobs, key=lambda job: (job["number"], job["due"])):
+        if job.get("attachment"):
+            # An image carries a single caption, so it is always sent on its own, and later
+            # texts must not jump ahead of it into an earlier group.
+            open_groups.pop(job["number"], None)
+            groups.append([job])
+            continue
+        group = open_groups.get(job["number"])
+        if group is not None:
+            first = group[0]
+            length = sum(len(member["message"]) for member in group) + len(separator) * len(group)
+            if job_time(job) - job_time(first) <= window and length + len(job["message"]) <= max_length:
+                group.append(job)
+                continue
+        group = [job]
+        open_groups[job["number"]] = group
+        groups.append(group)
+    merged = []
+    for group in groups:
+        if len(group) == 1:
+            merged.append(group[0])
+            continue
+        merged.append({
+            "id": None,
+            "number": group[0]["number"],
+            "message": separator.join(member["message"] for member in group),
+            "due": group[0]["due"],
+            "priority": min((member["priority"] for member in group), key=LANES.index),
+            "campaign": group[0]["campaign"],
+            "merged": group
+        })
+    return merged
+
+def take_coalesced(store, due, settings):
+    window = timedelta(minutes=settings["coalesce_window_minutes"])
+    until = max(job_time(job) for job in due) + window
+    followers = store.take_pending_for({job["number"] for job in due}, until)
+    ready, waiting = split_coalesced(due, followers, settings)
+    if waiting:
+        store.mark(waiting, "pending")
+    return ready
+
+def split_coalesced(due, followers, settings):
+    # Returns the sends that include a due job, and the ids of followers that must wait for their own time.
+    window = timedelta(minutes=settings["coalesce_window_minutes"])
+    due_ids = {job["id"] for job in due}
+    ready = []
+    waiting = []
+    for job in coalesce(due + followers, window, settings["coalesce_separator"], settings["coalesce_max_length"]):
+        members = job.get("merged", [job])
+        if any(member["id"] in due_ids for member in members):
+            ready.append(job)
+        else:
+            # Nothing in this group is due yet; it waits for its own time.
+            waiting.extend(member["id"] for member in members)
+    return ready, waiting
+
+def check_schedule(send_queue, store, schedule_file="schedule.json", catch_up=None, settings=None, now=None):
+    try:
+        import_schedule_file(store, schedule_file)
+    except Exception as e:
+        logging.error(f"Error importing schedule: {str(e)}")
+    now = now or datetime.now()
     try:
-        year = int(schedule_data.get("year"))
-        month = int(schedule_data.get("month"))
-        day = int(schedule_data.get("day"))
-        hour = int(schedule_data.get("hour"))
-        minute = int(schedule_data.get("minute"))
-        number = schedule_data.get("number")
-        message = schedule_data.get("message")
-        schedule_time = datetime(year, month, day, hour, minute)
-        now = datetime.now()
-        if now.year == year and now.month == month and now.day == day:
-            schedule.every().day.at(f"{hour:02d}:{minute:02d}").do(
-                send_whatsapp, number, message, hour, minute
-            )
-            logging.info(f"Scheduled message for {number} at {year}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}")
-        if now >= schedule_time:
-            schedule_data["active"] = False
-            with open(schedule_file, "w") as f:
-                json.dump(schedule_data, f, indent=2)
-            logging.info("Schedule deactivated after sending")
+        limit = -1
+        if settings is not None:
+            # Claim only what this worker can start soon so other workers get a share.
+            local = len(send_queue) + (catch_up.backlog.qsize() if catch_up is not None else 0)
+            limit = max(0, settings["claim_batch"] * len(send_queue.accounts) - local)
+        awake_since = None
+        if catch_up is not None:
+            catch_up.observe(now)
+            awake_since = catch_up.awake_since
+        due, late = collect_due(store.claim_due(now, limit) if limit else [], now, awake_since)
+        if catch_up is not None:
+            catch_up.handle(late, now)
+        elif late:
+            store.mark([job["id"] for job in late], "missed")
+        if due and settings and settings["coalesce_window_minutes"] > 0:
+            due = take_coalesced(store, due, settings)
     except Exception as e:
         logging.error(f"Error in scheduler: {str(e)}")
+        return
+    for job in due:
+        try:
+            send_queue.put(job, job["priority"], job["campaign"])
+            if job.get("merged"):
+                logging.info(f"Queued {len(job['merged'])} coalesced messages for {job['number']} in {job['priority']} lane")
+            else:
+                logging.info(f"Queued message for {job['number']} in {job['priority']} lane")
+        except Exception as e:
+            logging.error(f"Error in scheduler: {str(e)}")
+
+def drain_inbox(inbox, send_queue):
+    while True:
+        job = inbox.get()
+        try:
+            send_queue.put(job, job.get("priority", "interactive"), job.get("campaign"))
+            logging.info(f"Queued message for {job['number']} from the app")
+        except Exception as e:
+            logging.error(f"Error queueing message from the app: {str(e)}")
 
-def main():
-    schedule.every(60).seconds.do(check_schedule)
+def main(schedule_file="schedule.json", inbox=None, settings_file="scheduler_settings.json"):
+    settings = load_settings(settings_file)
+    store = JobStore(settings["job_store"], settings["worker_id"], settings["lease_seconds"])
+    if settings["worker_id"]:
+        # A fixed worker id means leases from our previous run are ours to hand back now.
+        released = store.release_leases()
+        if released:
+            logging.info(f"Released {released} messages leased by the previous run")
+    stats = SendStats(settings["stats_file"], HISTORY_FILE)
+    sharder = build_sharder(settings, store, stats)
+    sharder.start()
+    logging.info(f"Scheduler started with accounts: {', '.join(sharder.accounts)}")
+    if inbox is not None:
+        threading.Thread(target=drain_inbox, args=(inbox, sharder), daemon=True).start()
+    catch_up = CatchUp(sharder, store, settings)
+    threading.Thread(target=catch_up.run, daemon=True).start()
+    check_schedule(sharder, store, schedule_file, catch_up, settings)
+    schedule.every(CHECK_INTERVAL).seconds.do(check_schedule, sharder, store, schedule_file, catch_up, settings)
+    schedule.every(max(1, settings["lease_seconds"] // 3)).seconds.do(store.heartbeat)
+    logging.info(f"Worker {store.worker_id} claiming from {settings['job_store']}")
     while True:
         schedule.run_pending()
         time.sleep(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
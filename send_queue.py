@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+from collections import deque
+
+LANES = ("interactive", "scheduled", "bulk")
+DEFAULT_WEIGHTS = {"interactive": 8, "scheduled": 4, "bulk": 1}
+
+
+class RateLimiter:
+    """Token bucket; a rate of 0 means unlimited."""
+
+    def __init__(self, rate_per_minute, burst=1, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.tokens = float(burst)
+        self.clock = clock
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        if not self.rate:
+            return True
+        with self.lock:
+            self._refill()
+            # Tolerate float drift so a refill that lands exactly on a token counts.
+            if self.tokens >= 1 - 1e-9:
+                self.tokens = max(0.0, self.tokens - 1)
+                return True
+            return False
+
+    def wait_time(self):
+        if not self.rate:
+            return 0.0
+        with self.lock:
+            self._refill()
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+    def acquire(self):
+        while not self.try_acquire():
+            time.sleep(self.wait_time())
+
+    def refund(self):
+        if not self.rate:
+            return
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+
+class SendQueue:
+    """Priority lanes drained by smooth weighted round-robin.
+
+    The bulk lane keeps one sub-queue per campaign and rotates between them,
+    so one large batch cannot hold back another.
+    """
+
+    def __init__(self, dispatch, weights=None, limiter=None):
+        self.dispatch = dispatch
+        self.limiter = limiter
+        self.weights = dict(DEFAULT_WEIGHTS)
+        self.weights.update(weights or {})
+        self.lanes = {"interactive": deque(), "scheduled": deque()}
+        self.campaigns = {}
+        self.campaign_order = deque()
+        self.current = {lane: 0 for lane in LANES}
+        self.cond = threading.Condition()
+        self.running = True
+
+    def put(self, job, lane="scheduled", campaign=None):
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane: {lane}")
+        with self.cond:
+            if lane == "bulk":
+                key = campaign or ""
+                if key not in self.campaigns:
+                    self.campaigns[key] = deque()
+                    self.campaign_order.append(key)
+                self.campaigns[key].append(job)
+            else:
+                self.lanes[lane].append(job)
+            self.cond.notify()
+
+    def lane_depth(self, lane):
+        if lane == "bulk":
+            return sum(len(jobs) for jobs in self.campaigns.values())
+        return len(self.lanes[lane])
+
+    def depth(self):
+        with self.cond:
+            return {lane: self.lane_depth(lane) for lane in LANES}
+
+    def __len__(self):
+        with self.cond:
+            return sum(self.lane_depth(lane) for lane in LANES)
+
+    def _pick_lane(self):
+        total = 0
+        best = None
+        for lane in LANES:
+            if not self.lane_depth(lane):
+                # An idle lane neither banks credit nor carries debt.
+                self.current[lane] = 0
+                continue
+            self.current[lane] += self.weights[lane]
+            total += self.weights[lane]
+            if best is None or self.current[lane] > self.current[best]:
+                best = lane
+        if best is not None:
+            self.current[best] -= total
+        return best
+
+    def _pop(self, lane):
+        if lane != "bulk":
+            return self.lanes[lane].popleft()
+        key = self.campaign_order.popleft()
+        jobs = self.campaigns[key]
+        job = jobs.popleft()
+        if jobs:
+            self.campaign_order.append(key)
+        else:
+            del self.campaigns[key]
+        return job
+
+    def get(self, timeout=None):
+        with self.cond:
+            if not self.cond.wait_for(lambda: len(self.campaign_order) or any(self.lanes.values()), timeout):
+                return None
+            lane = self._pick_lane()
+            return lane, self._pop(lane)
+
+    def get_nowait(self):
+        with self.cond:
+            lane = self._pick_lane()
+            if lane is None:
+                return None
+            return lane, self._pop(lane)
+
+    def run(self):
+        while self.running:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            item = self.get(timeout=1)
+            if item is None:
+                if self.limiter is not None:
+                    self.limiter.refund()
+                continue
+            lane, job = item
+            try:
+                self.dispatch(job)
+            except Exception as e:
+                logging.error(f"Error dispatching {lane} job: {str(e)}")
+
+    def stop(self):
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
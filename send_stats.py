@@ -0,0 +1,240 @@
+import argparse
+import bisect
+import csv
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from history import HISTORY_FILE, entry_count, iter_entries
+
+STATS_FILE = "send_stats.db"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Upper bounds in seconds; the last bucket holds everything slower.
+LATENCY_BUCKETS = (30, 60, 120, 300, 900, 3600)
+LATENCY_LABELS = tuple(f"<={bound}s" for bound in LATENCY_BUCKETS) + (f">{LATENCY_BUCKETS[-1]}s",)
+SCOPES = ("all", "status", "hour", "day", "number")
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    success INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    latency_total REAL NOT NULL DEFAULT 0,
+    latency_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, key)
+);
+CREATE INDEX IF NOT EXISTS rollups_by_total ON rollups (scope, total);
+CREATE TABLE IF NOT EXISTS latency (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, key, bucket)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+UPSERT_ROLLUP = (
+    "INSERT INTO rollups (scope, key, total, success, failed, latency_total, latency_count) "
+    "VALUES (?, ?, 1, ?, ?, ?, ?) ON CONFLICT (scope, key) DO UPDATE SET "
+    "total = total + 1, success = success + excluded.success, failed = failed + excluded.failed, "
+    "latency_total = latency_total + excluded.latency_total, latency_count = latency_count + excluded.latency_count"
+)
+UPSERT_LATENCY = (
+    "INSERT INTO latency (scope, key, bucket, count) VALUES (?, ?, ?, 1) "
+    "ON CONFLICT (scope, key, bucket) DO UPDATE SET count = count + 1"
+)
+
+
+def latency_bucket(seconds):
+    return bisect.bisect_left(LATENCY_BUCKETS, seconds)
+
+
+class SendStats:
+    """Rollups of send history, kept up to date one entry at a time.
+
+    Every history write adds one to the counters of its hour, day, number and
+    status, so reading a dashboard touches a fixed number of rows no matter how
+    many messages were ever sent. A new stats file is seeded once from the
+    existing history; writers pass each entry's position so one that the seed
+    already counted is not counted again.
+    """
+
+    def __init__(self, path=STATS_FILE, history_file=HISTORY_FILE):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if history_file is not None:
+            self.seed(history_file)
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def seed(self, history_file):
+        # Checked inside the write transaction so two processes starting together seed only once.
+        with self.transaction() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE name = 'seeded'").fetchone():
+                return
+            count = self.load(conn, history_file)
+        if count:
+            logging.info(f"Seeded send statistics from {count} history entries")
+
+    def rebuild(self, history_file=HISTORY_FILE):
+        # One transaction, so a concurrent record() lands either before the wipe or after the reload.
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM rollups")
+            conn.execute("DELETE FROM latency")
+            count = self.load(conn, history_file)
+        logging.info(f"Rebuilt send statistics from {count} history entries")
+
+    def load(self, conn, history_file):
+        # Only the entries present now are read; anything appended later is recorded by its writer.
+        count = entry_count(history_file) if history_file else 0
+        for entry in itertools.islice(iter_entries(history_file), count):
+            self.add(conn, entry)
+        now = datetime.now().strftime(TIMESTAMP_FORMAT)
+        conn.executemany("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                         [("seeded", now), ("seeded_entries", str(count))])
+        return count
+
+    def record(self, entry, position=None):
+        # `position` is the entry's index in the history file, as returned by append_entry minus one.
+        with self.transaction() as conn:
+            if position is not None:
+                row = conn.execute("SELECT value FROM meta WHERE name = 'seeded_entries'").fetchone()
+                if row and position < int(row["value"]):
+                    return
+            self.add(conn, entry)
+
+    def add(self, conn, entry):
+        try:
+            when = datetime.strptime(entry.get("timestamp", ""), TIMESTAMP_FORMAT)
+        except ValueError:
+            when = None
+        status = entry.get("status", "") or "Unknown"
+        latency = entry.get("latency")
+        success = int(status == "Success")
+        failed = int(status == "Failed")
+        measured = latency is not None
+        keys = [("all", ""), ("status", status), ("number", entry.get("number", ""))]
+        if when is not None:
+            keys += [("hour", when.strftime("%Y-%m-%d %H:00")), ("day", when.strftime("%Y-%m-%d"))]
+        conn.executemany(UPSERT_ROLLUP, [
+            (scope, key, success, failed, latency if measured else 0.0, int(measured))
+            for scope, key in keys
+        ])
+        if measured:
+            bucket = latency_bucket(latency)
+            conn.executemany(UPSERT_LATENCY, [
+                (scope, key, bucket) for scope, key in keys if scope in ("all", "hour", "day")
+            ])
+
+    def rows(self, scope, since=None, order="key", limit=None):
+        query = "SELECT * FROM rollups WHERE scope = ?"
+        params = [scope]
+        if since is not None:
+            query += " AND key >= ?"
+            params.append(since)
+        query += " ORDER BY total DESC" if order == "total" else " ORDER BY key"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self.lock:
+            return [self.row_dict(row) for row in self.conn.execute(query, params)]
+
+    def histogram(self, scope="all", key=""):
+        counts = [0] * len(LATENCY_LABELS)
+        with self.lock:
+            for row in self.conn.execute("SELECT bucket, count FROM latency WHERE scope = ? AND key = ?", (scope, key)):
+                counts[row["bucket"]] = row["count"]
+        return dict(zip(LATENCY_LABELS, counts))
+
+    def row_dict(self, row):
+        row = dict(row)
+        row["success_rate"] = round(row["success"] / row["total"], 4) if row["total"] else None
+        row["avg_latency"] = round(row["latency_total"] / row["latency_count"], 1) if row["latency_count"] else None
+        row["latency_total"] = round(row["latency_total"], 1)
+        return row
+
+    def summary(self, now=None, hours=24, days=14, top=10):
+        now = now or datetime.now()
+        overall = self.rows("all")
+        return {
+            "overall": overall[0] if overall else self.row_dict({
+                "scope": "all", "key": "", "total": 0, "success": 0, "failed": 0, "latency_total": 0.0, "latency_count": 0
+            }),
+            "statuses": self.rows("status"),
+            "hours": self.rows("hour", since=(now - timedelta(hours=hours - 1)).strftime("%Y-%m-%d %H:00")),
+            "days": self.rows("day", since=(now - timedelta(days=days - 1)).strftime("%Y-%m-%d")),
+            "top_numbers": self.rows("number", order="total", limit=top),
+            "latency": self.histogram()
+        }
+
+    def export(self, path, fmt=None):
+        fmt = fmt or ("csv" if path.lower().endswith(".csv") else "json")
+        histograms = {}
+        with self.lock:
+            for row in self.conn.execute("SELECT * FROM latency"):
+                counts = histograms.setdefault((row["scope"], row["key"]), [0] * len(LATENCY_LABELS))
+                counts[row["bucket"]] = row["count"]
+        rows = []
+        for scope in SCOPES:
+            for row in self.rows(scope):
+                counts = histograms.get((scope, row["key"]))
+                row.update(zip(LATENCY_LABELS, counts or [None] * len(LATENCY_LABELS)))
+                rows.append(row)
+        if fmt == "csv":
+            fields = ["scope", "key", "total", "success", "failed", "success_rate", "avg_latency",
+                      "latency_total", "latency_count"] + list(LATENCY_LABELS)
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rows)
+        elif fmt == "json":
+            with open(path, "w") as f:
+                json.dump(rows, f, indent=2)
+        else:
+            raise ValueError(f"Unknown export format: {fmt}")
+        logging.info(f"Exported {len(rows)} statistics rows to {path}")
+        return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or export the send statistics rollups.")
+    parser.add_argument("--db", default=STATS_FILE)
+    parser.add_argument("--history", default=HISTORY_FILE)
+    parser.add_argument("--export", help="write every rollup to a .csv or .json file")
+    parser.add_argument("--format", choices=["csv", "json"], help="export format (default: from the file name)")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the rollups from the history file")
+    args = parser.parse_args()
+
+    stats = SendStats(args.db, args.history)
+    if args.rebuild:
+        stats.rebuild(args.history)
+    if args.export:
+        count = stats.export(args.export, args.format)
+        print(f"Exported {count} rows to {args.export}")
+    else:
+        print(json.dumps(stats.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+import argparse
+import bisect
+import heapq
+import json
+import math
+import os
+import random
+from collections import deque
+from datetime import datetime, timedelta
+from scheduler import (CHECK_INTERVAL, catch_up_action, catch_up_policy, collect_due, job_time, load_schedule,
+                       load_settings, schedule_entries, split_coalesced)
+from job_store import DUE_FORMAT, JobStore
+from accounts import Account, Sharder
+from send_queue import LANES, RateLimiter
+
+
+class VirtualClock:
+    def __init__(self, start):
+        self.start = start
+        self.elapsed = 0.0
+
+    def now(self):
+        return self.start + timedelta(seconds=self.elapsed)
+
+    def monotonic(self):
+        return self.elapsed
+
+    def advance_to(self, elapsed):
+        self.elapsed = max(self.elapsed, elapsed)
+
+
+class FakeBackend:
+    """Stands in for pywhatkit: draws a send duration and an outcome per job."""
+
+    def __init__(self, latency=45.0, jitter=5.0, distribution="normal", failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.distribution = distribution
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+
+    def send(self, job):
+        if self.distribution == "fixed":
+            duration = self.latency
+        elif self.distribution == "uniform":
+            duration = self.random.uniform(self.latency - self.jitter, self.latency + self.jitter)
+        elif self.distribution == "lognormal":
+            duration = self.latency * self.random.lognormvariate(0, self.jitter / self.latency)
+        else:
+            duration = self.random.gauss(self.latency, self.jitter)
+        return max(1.0, duration), self.random.random() >= self.failure_rate
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(p / 100.0 * len(values)) - 1)]
+
+
+def simulate(jobs, backend, settings, concurrency=1, rate_per_minute=None, start=None, days=1):
+    """Replays jobs through the scheduler's lane-ordered claims, catch-up policy, coalescing and per-account queues.
+
+    `concurrency` is the number of desktop sessions (one scheduler process each);
+    an account sends one message at a time, limited by its own rate.
+    """
+    jobs = [dict(job) for job in jobs]
+    if start is None:
+        start = min((job_time(job) for job in jobs), default=datetime.now())
+        start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    end = start + timedelta(days=days)
+    # Jobs due before the start were missed while the scheduler was down.
+    jobs = sorted((job for job in jobs if job_time(job) < end), key=job_time)
+    due_times = [job_time(job) for job in jobs]
+    for i, job in enumerate(jobs):
+        job["id"] = job.get("id") or f"sim-{i}"
+        job["due"] = due_times[i].strftime(DUE_FORMAT)
+        job["priority"] = job.get("priority") or "scheduled"
+        job.setdefault("campaign", None)
+    index = {job["id"]: i for i, job in enumerate(jobs)}
+    # Like claim_due: each lane is claimed in due order, interactive first.
+    lanes = {lane: [i for i, job in enumerate(jobs) if job["priority"] == lane] for lane in LANES}
+    cursors = dict.fromkeys(LANES, 0)
+    by_number = {}
+    for i, job in enumerate(jobs):
+        by_number.setdefault(job["number"], []).append(i)
+    taken = [False] * len(jobs)
+    taken_count = 0
+    # Due times of jobs taken early as coalescing followers, not yet due themselves.
+    taken_early = []
+    if rate_per_minute is None:
+        rate_per_minute = settings["rate_per_minute"]
+
+    clock = VirtualClock(start)
+    accounts = [
+        Account(config["name"], None, config.get("rate_per_minute", rate_per_minute),
+                config.get("burst", settings["burst"]), settings["weights"], clock=clock.monotonic)
+        for config in settings["accounts"]
+    ]
+    sharder = Sharder(accounts, None)
+    claim_limit = settings["claim_batch"] * len(accounts)
+    policy = catch_up_policy(settings)
+    coalescing = settings["coalesce_window_minutes"] > 0
+    window = timedelta(minutes=settings["coalesce_window_minutes"])
+    grace = timedelta(minutes=settings["catch_up_grace_minutes"])
+    catch_up_limiter = RateLimiter(settings["catch_up_per_minute"], settings["catch_up_burst"], clock=clock.monotonic)
+    catch_up_backlog = deque()
+    busy = set()
+    events = []
+    sequence = 0
+    free_sessions = concurrency
+    lateness = []
+    lane_lateness = {}
+    sent = failed = missed = rescheduled = coalesced = peak_depth = 0
+    first_start = None
+    last_done = 0.0
+
+    def push(at, kind, payload=None):
+        nonlocal sequence
+        sequence += 1
+        heapq.heappush(events, (at, sequence, kind, payload))
+
+    horizon = (end - start).total_seconds()
+    tick = 0.0
+    while tick <= horizon:
+        push(tick, "check")
+        tick += CHECK_INTERVAL
+
+    def take(i):
+        nonlocal taken_count
+        taken[i] = True
+        taken_count += 1
+        return jobs[i]
+
+    def take_followers(numbers, until):
+        followers = []
+        for number in numbers:
+            for i in by_number[number]:
+                if due_times[i] > until:
+                    break
+                if not taken[i]:
+                    followers.append(take(i))
+        return followers
+
+    wake_at = None
+    while events:
+        at, _, kind, payload = heapq.heappop(events)
+        clock.advance_to(at)
+        if kind == "check":
+            now = clock.now()
+            limit = max(0, claim_limit - len(sharder) - len(catch_up_backlog))
+            claimed = []
+            for lane in LANES:
+                indices = lanes[lane]
+                while cursors[lane] < len(indices) and len(claimed) < limit:
+                    i = indices[cursors[lane]]
+                    if due_times[i] > now:
+                        break
+                    cursors[lane] += 1
+                    if not taken[i]:
+                        claimed.append(take(i))
+            due, late = collect_due(claimed, now, start)
+            for job in late:
+                action = catch_up_action(policy, now - job_time(job), grace)
+                if action == "send":
+                    catch_up_backlog.append(job)
+                elif action == "reschedule":
+                    rescheduled += 1
+                else:
+                    missed += 1
+            if due and coalescing:
+                until = max(job_time(job) for job in due) + window
+                due, waiting = split_coalesced(due, take_followers({job["number"] for job in due}, until), settings)
+                for job_id in waiting:
+                    taken[index[job_id]] = False
+                    taken_count -= 1
+                for job in due:
+                    members = job.get("merged", [job])
+                    coalesced += len(members) if len(members) > 1 else 0
+                    for member in members:
+                        if job_time(member) > now:
+                            heapq.heappush(taken_early, job_time(member))
+            for job in due:
+                sharder.put(job, job["priority"], job["campaign"])
+            while taken_early and taken_early[0] <= now:
+                heapq.heappop(taken_early)
+            # Due jobs nobody has claimed yet wait in the store; they count toward the queue too.
+            unclaimed = bisect.bisect_right(due_times, now) - (taken_count - len(taken_early))
+            peak_depth = max(peak_depth, len(sharder) + len(catch_up_backlog) + unclaimed)
+        elif kind == "done":
+            account, lane, job, ok = payload
+            busy.discard(account.name)
+            free_sessions += 1
+            for member in job.get("merged", [job]):
+                late = (clock.now() - job_time(member)).total_seconds()
+                lateness.append(late)
+                lane_lateness.setdefault(lane, []).append(late)
+                sent += ok
+                failed += not ok
+            last_done = at
+        elif kind == "wake" and at == wake_at:
+            wake_at = None
+
+        waits = []
+        while catch_up_backlog:
+            if not catch_up_limiter.try_acquire():
+                waits.append(catch_up_limiter.wait_time())
+                break
+            job = catch_up_backlog.popleft()
+            sharder.put(job, job["priority"], job["campaign"])
+        for account in accounts:
+            if not free_sessions:
+                break
+            if account.name in busy or not len(account.queue):
+                continue
+            if not account.limiter.try_acquire():
+                waits.append(account.limiter.wait_time())
+                continue
+            lane, job = account.queue.get_nowait()
+            duration, ok = backend.send(job)
+            busy.add(account.name)
+            free_sessions -= 1
+            if first_start is None:
+                first_start = at
+            push(at + duration, "done", (account, lane, job, ok))
+        if waits and free_sessions and (wake_at is None or at + min(waits) < wake_at):
+            wake_at = at + min(waits)
+            push(wake_at, "wake")
+
+    lateness.sort()
+    hours = max(last_done - (first_start or 0.0), 1.0) / 3600.0
+    report = {
+        "jobs": len(jobs),
+        "accounts": len(accounts),
+        "sent": sent,
+        "failed": failed,
+        "missed": missed,
+        "rescheduled": rescheduled,
+        "coalesced": coalesced,
+        "unsent": len(jobs) - sent - failed - missed - rescheduled,
+        "peak_queue_depth": peak_depth,
+        "throughput_per_hour": round((sent + failed) / hours, 2),
+        "finished_at": (start + timedelta(seconds=last_done)).strftime("%Y-%m-%d %H:%M:%S"),
+        "lateness_seconds": {f"p{p}": round(percentile(lateness, p), 1) for p in (50, 90, 99, 100)},
+        "lane_p99_lateness_seconds": {lane: round(percentile(sorted(values), 99), 1) for lane, values in lane_lateness.items()}
+    }
+    return report
+
+
+def parse_list(value, cast):
+    return [cast(item) for item in str(value).split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the schedule against a simulated WhatsApp backend.")
+    parser.add_argument("--schedule", default="schedule.json")
+    parser.add_argument("--db", help="job store to replay (default: scheduler settings)")
+    parser.add_argument("--settings", default="scheduler_settings.json")
+    parser.add_argument("--start", help="first simulated day, YYYY-MM-DD (default: day of the first job)")
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument("--concurrency", default="1",
+                        help="desktop sessions (one scheduler process each), comma-separated for what-if runs")
+    parser.add_argument("--rate", help="messages per minute, comma-separated (default: scheduler settings)")
+    parser.add_argument("--latency", type=float, default=45.0)
+    parser.add_argument("--jitter", type=float, default=5.0)
+    parser.add_argument("--distribution", choices=["fixed", "uniform", "normal", "lognormal"], default="normal")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    settings = load_settings(args.settings)
+    jobs = [job for job in schedule_entries(load_schedule(args.schedule)) if job.get("active")]
+    db = args.db or settings["job_store"]
+    if os.path.exists(db):
+        jobs += JobStore(db).pending()
+    start = datetime.strptime(args.start, "%Y-%m-%d") if args.start else None
+    rates = parse_list(args.rate, float) if args.rate else [settings["rate_per_minute"]]
+    reports = []
+    for concurrency in parse_list(args.concurrency, int):
+        for rate in rates:
+            backend = FakeBackend(args.latency, args.jitter, args.distribution, args.failure_rate, args.seed)
+            report = simulate(jobs, backend, settings, concurrency, rate, start, args.days)
+            report.update({"concurrency": concurrency, "rate_per_minute": rate})
+            reports.append(report)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+    for report in reports:
+        lateness = report["lateness_seconds"]
+        print(f"concurrency={report['concurrency']} accounts={report['accounts']} rate={report['rate_per_minute']}/min: "
+              f"{report['sent']} sent, {report['failed']} failed, {report['missed']} missed, "
+              f"{report['rescheduled']} rescheduled, {report['coalesced']} coalesced, peak queue {report['peak_queue_depth']}, "
+              f"{report['throughput_per_hour']}/h, done {report['finished_at']}, "
+              f"lateness p50={lateness['p50']}s p90={lateness['p90']}s p99={lateness['p99']}s max={lateness['p100']}s")
+
+
+if __name__ == "__main__":
+    main()
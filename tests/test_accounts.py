@@ -0,0 +1,100 @@
+from accounts import COOLDOWN, UNHEALTHY_AFTER, Account, Sharder
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_sharder(names, clock, send=None):
+    accounts = [Account(name, clock=clock) for name in names]
+    return Sharder(accounts, send or (lambda account, job: True)), accounts
+
+
+def numbers(count):
+    return [f"+569{i:08d}" for i in range(count)]
+
+
+def owned_by(sharder, name, count=1000):
+    return [number for number in numbers(count) if sharder.route(number).name == name]
+
+
+def test_recipients_stick_to_one_account():
+    clock = Clock()
+    sharder, _ = make_sharder(["a", "b", "c"], clock)
+    first = {number: sharder.route(number).name for number in numbers(1000)}
+    assert all(sharder.route(number).name == name for number, name in first.items())
+    # Every account gets a fair share of recipients.
+    for name in ("a", "b", "c"):
+        assert 200 < list(first.values()).count(name) < 470
+
+
+def test_adding_an_account_only_moves_recipients_to_it():
+    clock = Clock()
+    before, _ = make_sharder(["a", "b", "c"], clock)
+    after, _ = make_sharder(["a", "b", "c", "d"], clock)
+    moved = [number for number in numbers(1000) if before.route(number).name != after.route(number).name]
+    assert all(after.route(number).name == "d" for number in moved)
+    assert len(moved) < 400
+
+
+def test_unhealthy_account_is_routed_around_until_cooldown_ends():
+    clock = Clock()
+    sharder, accounts = make_sharder(["a", "b", "c"], clock)
+    recipients = owned_by(sharder, "a")
+    for _ in range(UNHEALTHY_AFTER):
+        accounts[0].record(False)
+    assert not accounts[0].healthy()
+    fallback = {number: sharder.route(number).name for number in recipients}
+    assert set(fallback.values()) <= {"b", "c"}
+    for number in recipients:
+        # The fallback is the next account on the ring, so it is stable too.
+        assert [owner.name for owner in sharder.owners(number)][1] == fallback[number]
+    clock.now += COOLDOWN
+    assert all(sharder.route(number).name == "a" for number in recipients)
+
+
+def test_failover_moves_queued_jobs_to_the_next_healthy_account():
+    clock = Clock()
+    sent = []
+    sharder, accounts = make_sharder(["a", "b", "c"], clock, lambda account, job: account.name != "a")
+    recipients = owned_by(sharder, "a")[:6]
+    for i, number in enumerate(recipients):
+        sharder.put({"id": str(i), "number": number}, "bulk" if i % 2 else "scheduled", "promo")
+    assert sharder.depth()["a"] == 6
+    for _ in range(UNHEALTHY_AFTER):
+        lane, job = accounts[0].queue.get_nowait()
+        sent.append(job["id"])
+        sharder.dispatch(accounts[0], job)
+    assert sharder.depth()["a"] == 0
+    assert len(sharder) == 6 - len(sent)
+    for account in accounts[1:]:
+        while (item := account.queue.get_nowait()) is not None:
+            lane, job = item
+            assert sharder.route(job["number"]) is account
+            assert lane == ("bulk" if int(job["id"]) % 2 else "scheduled")
+
+
+def test_failover_keeps_jobs_when_every_account_is_down():
+    clock = Clock()
+    sharder, accounts = make_sharder(["a", "b"], clock, lambda account, job: False)
+    recipients = owned_by(sharder, "a")[:4] + owned_by(sharder, "b")[:4]
+    for _ in range(UNHEALTHY_AFTER):
+        accounts[1].record(False)
+    for i, number in enumerate(recipients):
+        accounts[0].queue.put({"id": str(i), "number": number})
+    for _ in range(UNHEALTHY_AFTER):
+        sharder.dispatch(accounts[0], accounts[0].queue.get_nowait()[1])
+    assert sharder.depth() == {"a": 5, "b": 0}
+    kept = [accounts[0].queue.get_nowait()[1]["id"] for _ in range(5)]
+    assert kept == [str(i) for i in range(3, 8)]
+    # Once an account recovers, the next failover hands the jobs to it.
+    clock.now += COOLDOWN
+    accounts[0].down_until = clock.now + COOLDOWN
+    for i, number in enumerate(recipients):
+        accounts[0].queue.put({"id": str(i), "number": number})
+    sharder.failover(accounts[0])
+    assert sharder.depth() == {"a": 0, "b": 8}
@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import scheduler
+from job_store import JobStore, normalize_job
+
+START = datetime(2030, 1, 1, 8, 0)
+DUE = datetime(2030, 1, 1, 9, 0)
+
+
+class OneAccount:
+    """Stands in for the sharder: a single account that finishes one send per minute."""
+
+    def __init__(self, store):
+        self.store = store
+        self.accounts = {"default": None}
+        self.jobs = []
+
+    def put(self, job, lane="scheduled", campaign=None):
+        self.jobs.append(job)
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def send_one(self):
+        if self.jobs:
+            self.store.mark([self.jobs.pop(0)["id"]], "sent")
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"))
+
+
+def add_batch(store, count, due=DUE):
+    store.add_jobs([
+        normalize_job({"number": f"+569{i:08d}", "message": "hola", "due": f"{due:%Y-%m-%d %H:%M}",
+                       "priority": "bulk", "campaign": "promo"})
+        for i in range(count)
+    ])
+
+
+def statuses(store):
+    return dict(store.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+def run_worker(store, tmp_path, settings, awake_since, until, send_every=4):
+    sender = OneAccount(store)
+    catch_up = scheduler.CatchUp(sender, store, settings)
+    catch_up.awake_since = awake_since
+    now = awake_since
+    checks = 0
+    while now < until:
+        scheduler.check_schedule(sender, store, str(tmp_path / "schedule.json"), catch_up, settings, now)
+        checks += 1
+        if checks % send_every == 0:
+            sender.send_one()
+        now += timedelta(seconds=scheduler.CHECK_INTERVAL)
+    return sender, catch_up
+
+
+@pytest.mark.parametrize("policy", scheduler.CATCH_UP_POLICIES)
+def test_large_batch_due_at_once_drains_without_catch_up(store, tmp_path, policy):
+    add_batch(store, 300)
+    settings = dict(scheduler.DEFAULT_SETTINGS, catch_up=policy)
+    sender, catch_up = run_worker(store, tmp_path, settings, START, DUE + timedelta(hours=6))
+    assert statuses(store) == {"sent": 300}
+    assert catch_up.backlog.empty()
+
+
+def test_claims_stay_within_cap_while_batch_drains(store, tmp_path):
+    add_batch(store, 50)
+    settings = dict(scheduler.DEFAULT_SETTINGS, claim_batch=5)
+    sender = OneAccount(store)
+    scheduler.check_schedule(sender, store, str(tmp_path / "schedule.json"), None, settings, DUE)
+    assert len(sender) == 5
+    assert statuses(store) == {"queued": 5, "pending": 45}
+
+
+def test_jobs_due_while_worker_was_down_follow_policy(store, tmp_path):
+    add_batch(store, 3)
+    settings = dict(scheduler.DEFAULT_SETTINGS, catch_up="skip")
+    sender, catch_up = run_worker(store, tmp_path, settings, DUE + timedelta(minutes=30), DUE + timedelta(minutes=31))
+    assert statuses(store) == {"missed": 3}
+    assert len(sender) == 0
+
+
+def test_send_late_queues_downtime_jobs_within_grace(store, tmp_path):
+    add_batch(store, 3)
+    settings = dict(scheduler.DEFAULT_SETTINGS, catch_up="send_late")
+    sender, catch_up = run_worker(store, tmp_path, settings, DUE + timedelta(minutes=30), DUE + timedelta(minutes=31))
+    assert catch_up.backlog.qsize() == 3
+    assert len(sender) == 0
+
+
+def test_suspend_gap_counts_as_downtime(store, tmp_path):
+    settings = dict(scheduler.DEFAULT_SETTINGS, catch_up="skip")
+    catch_up = scheduler.CatchUp(OneAccount(store), store, settings)
+    catch_up.awake_since = START
+    catch_up.observe(DUE - timedelta(seconds=15))
+    add_batch(store, 2)
+    resumed = DUE + timedelta(hours=1)
+    scheduler.check_schedule(OneAccount(store), store, str(tmp_path / "schedule.json"), catch_up, settings, resumed)
+    assert catch_up.awake_since == resumed
+    assert statuses(store) == {"missed": 2}
+
+
+def test_reclaimed_lease_is_late(store):
+    add_batch(store, 1)
+    dead = JobStore(store.path, "dead-worker", lease_seconds=-1)
+    dead.claim_due(DUE, 10)
+    now = DUE + timedelta(minutes=10)
+    due, late = scheduler.collect_due(store.claim_due(now, 10), now, START)
+    assert (len(due), len(late)) == (0, 1)
+
+
+def test_interactive_job_behind_due_bulk_batch_is_claimed_next_check(store, tmp_path):
+    add_batch(store, 200)
+    [urgent] = store.add_jobs([normalize_job({"number": "+56999999999", "message": "ya",
+                                              "due": f"{DUE + timedelta(minutes=1):%Y-%m-%d %H:%M}",
+                                              "priority": "interactive"})])
+    settings = dict(scheduler.DEFAULT_SETTINGS)
+    sender = OneAccount(store)
+    catch_up = scheduler.CatchUp(sender, store, settings)
+    catch_up.awake_since = START
+    scheduler.check_schedule(sender, store, str(tmp_path / "schedule.json"), catch_up, settings, DUE)
+    assert len(sender) == settings["claim_batch"]
+    sender.send_one()
+    scheduler.check_schedule(sender, store, str(tmp_path / "schedule.json"), catch_up, settings,
+                             DUE + timedelta(minutes=1))
+    assert store.get(urgent)["status"] == "queued"
+    assert urgent in [job["id"] for job in sender.jobs]
+
+
+def test_catch_up_action_follows_policy_and_grace():
+    grace = timedelta(minutes=60)
+    assert scheduler.catch_up_action("send_late", timedelta(minutes=30), grace) == "send"
+    assert scheduler.catch_up_action("send_late", timedelta(minutes=90), grace) == "missed"
+    assert scheduler.catch_up_action("reschedule", timedelta(minutes=30), grace) == "send"
+    assert scheduler.catch_up_action("reschedule", timedelta(minutes=90), grace) == "reschedule"
+    assert scheduler.catch_up_action("skip", timedelta(minutes=5), grace) == "missed"
+    assert scheduler.catch_up_policy(dict(scheduler.DEFAULT_SETTINGS, catch_up="later")) == "skip"
@@ -0,0 +1,107 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import scheduler
+from accounts import Account
+from job_store import JobStore, normalize_job
+
+WINDOW = timedelta(minutes=10)
+NOW = datetime(2030, 1, 1, 9, 0)
+
+
+def job(number, minute, message=None, priority="scheduled", **extra):
+    return normalize_job(dict({"number": number, "message": message or f"a las 9:{minute:02d}",
+                               "due": f"2030-01-01 09:{minute:02d}", "priority": priority}, **extra))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"), "a")
+
+
+def settings():
+    return dict(scheduler.DEFAULT_SETTINGS, coalesce_window_minutes=10)
+
+
+def test_merges_messages_to_one_number_within_the_window():
+    jobs = [job("+56911111111", 0), job("+56911111111", 5, priority="interactive"), job("+56911111111", 15),
+            job("+56922222222", 1)]
+    merged = {(m["number"], m["due"]): m for m in scheduler.coalesce(jobs, WINDOW, " | ", 1000)}
+    first = merged[("+56911111111", "2030-01-01 09:00:00")]
+    assert first["message"] == "a las 9:00 | a las 9:05"
+    assert first["priority"] == "interactive"
+    assert first["id"] is None
+    assert [member["id"] for member in first["merged"]] == [jobs[0]["id"], jobs[1]["id"]]
+    assert "merged" not in merged[("+56911111111", "2030-01-01 09:15:00")]
+    assert "merged" not in merged[("+56922222222", "2030-01-01 09:01:00")]
+
+
+def test_respects_max_length():
+    jobs = [job("+56911111111", i, "x" * 40) for i in range(3)]
+    merged = scheduler.coalesce(jobs, WINDOW, "\n\n", 90)
+    assert [len(m.get("merged", [m])) for m in merged] == [2, 1]
+
+
+def test_attachment_is_sent_alone_and_keeps_its_place(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    image = tmp_path / "flyer.png"
+    image.write_bytes(b"\x89PNG fake image bytes")
+    jobs = [job("+56911111111", 0), job("+56911111111", 1, attachment=str(image)), job("+56911111111", 2),
+            job("+56911111111", 3)]
+    merged = scheduler.coalesce(jobs, WINDOW, "\n\n", 1000)
+    # The 9:02 text must not ride along with the 9:00 one ahead of the 9:01 image.
+    assert [m["due"][11:16] for m in merged] == ["09:00", "09:01", "09:02"]
+    assert [len(m.get("merged", [m])) for m in merged] == [1, 1, 2]
+    assert merged[1]["attachment"]
+
+
+def test_take_pending_for_reads_only_the_given_numbers(store, monkeypatch):
+    monkeypatch.setattr("job_store.NUMBERS_PER_QUERY", 2)
+    jobs = [job(f"+5691111111{i}", i) for i in range(5)] + [job("+56911111110", 20)]
+    store.add_jobs(jobs)
+    taken = store.take_pending_for({"+56911111110", "+56911111112", "+56911111113", "+56911111119"},
+                                   datetime(2030, 1, 1, 9, 10))
+    assert sorted(j["id"] for j in taken) == sorted(jobs[i]["id"] for i in (0, 2, 3))
+    assert all(store.get(j["id"])["status"] == "queued" for j in taken)
+    assert store.get(jobs[1]["id"])["status"] == "pending"
+
+
+def test_take_coalesced_leases_followers_and_returns_the_rest(store):
+    due = job("+56911111111", 0)
+    follower = job("+56911111111", 8)
+    later = job("+56911111111", 30)
+    other = job("+56922222222", 5)
+    store.add_jobs([due, follower, later, other])
+    claimed = store.claim_due(NOW, 10)
+    ready = scheduler.take_coalesced(store, claimed, settings())
+    assert len(ready) == 1
+    assert {member["id"] for member in ready[0]["merged"]} == {due["id"], follower["id"]}
+    assert store.get(follower["id"])["status"] == "queued"
+    assert store.get(follower["id"])["lease_owner"] == "a"
+    assert store.get(later["id"])["status"] == "pending"
+    assert store.get(other["id"])["status"] == "pending"
+
+
+def test_followers_go_to_only_one_worker(store):
+    other = JobStore(store.path, "b")
+    store.add_jobs([job("+56911111111", 0), job("+56922222222", 0), job("+56911111111", 5), job("+56922222222", 5)])
+    mine = scheduler.take_coalesced(store, store.claim_due(NOW, 1), settings())
+    theirs = scheduler.take_coalesced(other, other.claim_due(NOW, 1), settings())
+    ids = [member["id"] for group in mine + theirs for member in group["merged"]]
+    assert len(ids) == len(set(ids)) == 4
+
+
+def test_merged_send_records_every_original(store, tmp_path, monkeypatch):
+    history = str(tmp_path / "send_history.json")
+    monkeypatch.setattr(scheduler, "HISTORY_FILE", history)
+    sent = []
+    monkeypatch.setattr(scheduler, "send_whatsapp", lambda number, message, *args: sent.append(message))
+    store.add_jobs([job("+56911111111", 0), job("+56911111111", 5)])
+    [group] = scheduler.take_coalesced(store, store.claim_due(NOW, 1), settings())
+    assert scheduler.make_sender(store)(Account("a"), group)
+    assert sent == ["a las 9:00\n\na las 9:05"]
+    assert [store.get(member["id"])["status"] for member in group["merged"]] == ["sent", "sent"]
+    with open(history) as f:
+        assert [e["message"] for e in json.load(f)] == ["a las 9:00", "a las 9:05"]
@@ -0,0 +1,143 @@
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from history import HistoryWindow, append_entry, iter_entries, read_before, read_tail
+
+
+def entry(i):
+    return {"timestamp": f"2030-01-01 09:00:{i % 60:02d}", "number": "+56912345678", "message": f"mensaje {i}",
+            "status": "Success", "error": ""}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "send_history.json")
+
+
+def test_append_keeps_the_file_a_valid_json_list(path):
+    for i in range(5):
+        append_entry(path, entry(i))
+        with open(path) as f:
+            assert json.load(f) == [entry(j) for j in range(i + 1)]
+
+
+def test_append_extends_existing_indented_and_empty_lists(path):
+    with open(path, "w") as f:
+        json.dump([entry(0)], f, indent=2)
+        f.write("\n\n")
+    append_entry(path, entry(1))
+    with open(path) as f:
+        assert json.load(f) == [entry(0), entry(1)]
+    with open(path, "w") as f:
+        f.write("[ ]")
+    append_entry(path, entry(2))
+    with open(path) as f:
+        assert json.load(f) == [entry(2)]
+
+
+def test_append_rejects_files_that_are_not_lists(path):
+    with open(path, "w") as f:
+        f.write('{"not": "a list"}')
+    with pytest.raises(ValueError):
+        append_entry(path, entry(0))
+
+
+def test_iter_entries_streams_across_chunk_boundaries(path, monkeypatch):
+    monkeypatch.setattr("history.CHUNK_SIZE", 64)
+    for i in range(50):
+        append_entry(path, entry(i))
+    assert list(iter_entries(path)) == [entry(i) for i in range(50)]
+
+
+def append_many(path, worker, count):
+    for i in range(count):
+        append_entry(path, dict(entry(i), number=f"+5690000000{worker}"))
+
+
+def test_concurrent_appends_from_several_processes(path):
+    workers = [multiprocessing.Process(target=append_many, args=(path, worker, 50)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+    with open(path) as f:
+        entries = json.load(f)
+    assert len(entries) == 200
+    for worker in range(4):
+        messages = [e["message"] for e in entries if e["number"] == f"+5690000000{worker}"]
+        assert messages == [f"mensaje {i}" for i in range(50)]
+
+
+def test_older_pages_are_anchored_to_the_load_position(path):
+    for i in range(30):
+        append_entry(path, entry(i))
+    recent, total = read_tail(path, 5)
+    assert [r.message for r in recent] == [f"mensaje {i}" for i in range(25, 30)]
+    # Another process appends after the app loaded its tail.
+    for i in range(30, 40):
+        append_entry(path, entry(i))
+    first = read_before(path, total - len(recent), 10)
+    second = read_before(path, total - len(recent) - len(first), 10)
+    assert [r.message for r in second + first] == [f"mensaje {i}" for i in range(5, 25)]
+    assert [r.message for r in read_before(path, 5, 10)] == [f"mensaje {i}" for i in range(5)]
+    assert read_before(path, 0, 10) == []
+
+
+def messages(rows):
+    return [r.message for r in rows]
+
+
+def test_load_older_covers_rows_appended_by_the_app(path):
+    for i in range(30):
+        append_entry(path, entry(i))
+    window = HistoryWindow(path, 5, 10)
+    window.load()
+    # These push rows out of the recent buffer while nothing older is shown.
+    for i in range(30, 37):
+        window.append(entry(i))
+    assert messages(window.rows()) == [f"mensaje {i}" for i in range(32, 37)]
+    while window.load_older():
+        pass
+    assert messages(window.rows()) == [f"mensaje {i}" for i in range(37)]
+
+
+def test_expanded_view_stays_contiguous_while_appending(path):
+    for i in range(20):
+        append_entry(path, entry(i))
+    window = HistoryWindow(path, 5, 10)
+    window.load()
+    window.load_older()
+    for i in range(20, 23):
+        window.append(entry(i))
+    # Another process appends too; its rows are not shown but must not open a gap.
+    append_entry(path, entry(23))
+    window.append(entry(24))
+    assert messages(window.rows()) == [f"mensaje {i}" for i in list(range(5, 23)) + [24]]
+    window.load_older()
+    assert messages(window.rows())[:5] == [f"mensaje {i}" for i in range(5)]
+
+
+def test_offsets_survive_unicode_and_crlf(path):
+    entries = [dict(entry(i), message=f"año {i} 📱 ñandú") for i in range(12)]
+    with open(path, "w", encoding="utf-8", newline="\r\n") as f:
+        json.dump(entries[:10], f, indent=2, ensure_ascii=False)
+    for e in entries[10:]:
+        append_entry(path, e)
+    assert messages(read_before(path, 12, 12)) == [e["message"] for e in entries]
+    assert messages(read_before(path, 3, 2)) == [entries[1]["message"], entries[2]["message"]]
+
+
+def test_missing_or_stale_index_is_rebuilt(path):
+    for i in range(10):
+        append_entry(path, entry(i))
+    os.remove(path + ".idx")
+    assert messages(read_before(path, 10, 3)) == [f"mensaje {i}" for i in range(7, 10)]
+    # A writer that does not know about the index rewrites the file.
+    with open(path, "w") as f:
+        json.dump([entry(i) for i in range(100, 104)], f, indent=2)
+    assert messages(read_tail(path, 10)[0]) == [f"mensaje {i}" for i in range(100, 104)]
+    assert append_entry(path, entry(104)) == 5
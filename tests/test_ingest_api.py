@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import pytest
+
+import ingest_api
+from ingest_api import IngestServer
+from job_store import JobStore
+
+
+def job(i):
+    return {"number": f"+569{i:08d}", "message": "hola", "due": "2030-01-01 09:00"}
+
+
+def post(server, payload):
+    return asyncio.run(server.respond("POST", "/jobs", json.dumps(payload).encode("utf-8")))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"))
+
+
+def test_backpressure_lifts_once_the_store_drains(store, monkeypatch):
+    monkeypatch.setattr(ingest_api, "BACKLOG_REFRESH", 0.0)
+    server = IngestServer(store, high_water=3)
+    ids = [post(server, job(i))[1]["id"] for i in range(3)]
+    assert post(server, job(3))[0] == 429
+    store.mark(ids, "sent")
+    status, payload = post(server, job(3))
+    assert status == 201
+    assert store.get(payload["id"])["status"] == "pending"
+    assert asyncio.run(server.respond("GET", "/health", b""))[1]["pending"] == 1
+
+
+def test_backpressure_holds_while_the_store_is_full(store, monkeypatch):
+    monkeypatch.setattr(ingest_api, "BACKLOG_REFRESH", 0.0)
+    server = IngestServer(store, high_water=2)
+    post(server, job(0))
+    post(server, job(1))
+    assert post(server, job(2))[0] == 429
+    assert store.pending_count() == 2
+
+
+def test_reused_id_with_new_content_is_a_conflict(store):
+    server = IngestServer(store)
+    booking = dict(job(0), id="booking-1")
+    assert post(server, booking) == (201, {"id": "booking-1"})
+    assert post(server, booking) == (200, {"id": "booking-1"})
+    status, payload = post(server, dict(booking, message="cambio", due="2030-01-01 10:00"))
+    assert status == 409
+    assert store.get("booking-1")["message"] == "hola"
+    assert server.backlog == 1
+
+
+def test_bulk_reports_conflicting_ids(store):
+    server = IngestServer(store)
+    post(server, dict(job(0), id="booking-1"))
+    body = json.dumps({"jobs": [dict(job(1), id="booking-1"), dict(job(2), id="booking-2")]}).encode("utf-8")
+    status, payload = asyncio.run(server.respond("POST", "/jobs/bulk", body))
+    assert status == 201
+    assert payload == {"ids": ["booking-2"], "conflicts": ["booking-1"]}
+    assert server.backlog == 2
+
+
+def test_cancel_then_post_reschedules_under_the_same_id(store):
+    server = IngestServer(store)
+    booking = dict(job(0), id="booking-1")
+    post(server, booking)
+    assert asyncio.run(server.respond("DELETE", "/jobs/booking-1", b""))[0] == 200
+    assert post(server, dict(booking, due="2030-01-01 10:00"))[0] == 201
+    stored = store.get("booking-1")
+    assert (stored["status"], stored["due"]) == ("pending", "2030-01-01 10:00:00")
@@ -0,0 +1,121 @@
+import multiprocessing
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import scheduler
+from accounts import Account
+from job_store import JobStore, normalize_job
+
+DUE = datetime(2030, 1, 1, 9, 0)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+
+def add(store, count, number=None):
+    return store.add_jobs([
+        normalize_job({"number": number or f"+569{i:08d}", "message": f"mensaje {i}", "due": f"{DUE:%Y-%m-%d %H:%M}"})
+        for i in range(count)
+    ])
+
+
+def status(store, job_id):
+    return store.get(job_id)["status"]
+
+
+def expire(store, job_ids):
+    with store.transaction() as conn:
+        conn.executemany("UPDATE jobs SET lease_expires = ? WHERE id = ?", [(time.time() - 1, job_id) for job_id in job_ids])
+
+
+def test_claim_due_leases_each_job_to_one_worker(path):
+    first = JobStore(path, "a")
+    second = JobStore(path, "b")
+    add(first, 10)
+    claimed_a = first.claim_due(DUE, 6)
+    claimed_b = second.claim_due(DUE, 6)
+    assert len(claimed_a) == 6
+    assert len(claimed_b) == 4
+    assert not {job["id"] for job in claimed_a} & {job["id"] for job in claimed_b}
+    assert second.claim_due(DUE, 6) == []
+
+
+def test_expired_lease_is_reclaimed_and_old_owner_cannot_renew(path):
+    first = JobStore(path, "a")
+    second = JobStore(path, "b")
+    [job_id] = add(first, 1)
+    first.claim_due(DUE, 1)
+    expire(first, [job_id])
+    assert [job["id"] for job in second.claim_due(DUE, 1)] == [job_id]
+    assert not first.renew([job_id])
+    assert second.renew([job_id])
+    assert second.get(job_id)["lease_owner"] == "b"
+
+
+def test_heartbeat_does_not_revive_expired_leases(path):
+    store = JobStore(path, "a")
+    ids = add(store, 2)
+    store.claim_due(DUE, 2)
+    expire(store, ids[:1])
+    assert store.heartbeat() == 1
+    assert store.get(ids[0])["lease_expires"] < time.time()
+
+
+def test_failed_renew_returns_held_members_to_pending(path, monkeypatch):
+    store = JobStore(path, "a")
+    other = JobStore(path, "b")
+    ids = add(store, 3, number="+56912345678")
+    store.claim_due(DUE, 3)
+    expire(store, ids[:1])
+    other.claim_due(DUE, 1)
+    group = {"number": "+56912345678", "message": "m", "merged": [store.get(job_id) for job_id in ids]}
+    sent = []
+    monkeypatch.setattr(scheduler, "send_whatsapp", lambda *args: sent.append(args))
+    send = scheduler.make_sender(store)
+    assert send(Account("a"), group)
+    assert sent == []
+    assert status(store, ids[0]) == "queued" and store.get(ids[0])["lease_owner"] == "b"
+    assert [status(store, job_id) for job_id in ids[1:]] == ["pending", "pending"]
+    assert store.heartbeat() == 0
+
+
+def test_mark_clears_the_lease(path):
+    store = JobStore(path, "a")
+    [job_id] = add(store, 1)
+    store.claim_due(DUE, 1)
+    store.mark([job_id], "sent")
+    job = store.get(job_id)
+    assert (job["status"], job["lease_owner"], job["lease_expires"]) == ("sent", None, None)
+    assert store.claim_due(DUE + timedelta(days=1), 10) == []
+
+
+def drain(path, worker_id, results):
+    store = JobStore(path, worker_id)
+    claimed = []
+    while True:
+        jobs = store.claim_due(DUE, 7)
+        if not jobs:
+            break
+        ids = [job["id"] for job in jobs]
+        assert store.renew(ids)
+        store.mark(ids, "sent")
+        claimed.extend(ids)
+    results.put(claimed)
+
+
+def test_concurrent_workers_send_each_job_exactly_once(path):
+    ids = add(JobStore(path), 400)
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=drain, args=(path, f"worker-{i}", results)) for i in range(4)]
+    for worker in workers:
+        worker.start()
+    claimed = [job_id for _ in workers for job_id in results.get(timeout=60)]
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+    assert sorted(claimed) == sorted(ids)
+    assert JobStore(path).pending_count() == 0
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+import media_cache
+from job_store import normalize_job
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "flyer.png"
+    if media_cache.Image is not None:
+        media_cache.Image.new("RGB", (3200, 1600), "red").save(path)
+    else:
+        path.write_bytes(b"\x89PNG fake image bytes")
+    return str(path)
+
+
+def test_same_content_is_cached_once_at_an_absolute_path(image, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    calls = []
+    original = media_cache.preprocess_image
+    monkeypatch.setattr(media_cache, "preprocess_image", lambda *args: calls.append(args) or original(*args))
+    copy = tmp_path / "copy.png"
+    copy.write_bytes(open(image, "rb").read())
+    cached = {media_cache.cache_attachment(path) for path in [image] * 5 + [str(copy)]}
+    assert len(cached) == 1
+    assert len(calls) == 1
+    [path] = cached
+    assert os.path.isabs(path) and os.path.exists(path)
+    assert os.path.dirname(path) == str(tmp_path / media_cache.CACHE_DIR)
+
+
+def test_jobs_carry_the_cached_path(image, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    job = normalize_job({"number": "+56912345678", "message": "hola", "due": "2030-01-01 09:00", "attachment": image})
+    assert job["attachment"] == media_cache.cache_attachment(image)
+
+
+def test_documents_are_rejected(tmp_path):
+    document = tmp_path / "terms.pdf"
+    document.write_bytes(b"%PDF")
+    with pytest.raises(ValueError):
+        normalize_job({"number": "+56912345678", "message": "hola", "due": "2030-01-01 09:00", "attachment": str(document)})
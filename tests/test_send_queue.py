@@ -0,0 +1,110 @@
+from collections import Counter
+
+import pytest
+
+from send_queue import RateLimiter, SendQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def fill(queue, lane, count, campaign=None):
+    for i in range(count):
+        queue.put({"lane": lane, "i": i, "campaign": campaign}, lane, campaign)
+
+
+def drain(queue, count):
+    return [queue.get_nowait() for _ in range(count)]
+
+
+def test_busy_lanes_are_served_by_weight():
+    queue = SendQueue(None)
+    for lane in ("interactive", "scheduled", "bulk"):
+        fill(queue, lane, 130, "promo" if lane == "bulk" else None)
+    served = Counter(lane for lane, _ in drain(queue, 130))
+    assert served == {"interactive": 80, "scheduled": 40, "bulk": 10}
+
+
+def test_smooth_round_robin_interleaves_lanes():
+    queue = SendQueue(None, {"interactive": 2, "scheduled": 1, "bulk": 1})
+    for lane in ("interactive", "scheduled", "bulk"):
+        fill(queue, lane, 10)
+    lanes = [lane for lane, _ in drain(queue, 8)]
+    assert lanes == ["interactive", "scheduled", "bulk", "interactive"] * 2
+
+
+def test_each_lane_is_first_in_first_out():
+    queue = SendQueue(None)
+    fill(queue, "scheduled", 5)
+    assert [job["i"] for _, job in drain(queue, 5)] == list(range(5))
+    assert queue.get_nowait() is None
+
+
+def test_bulk_lane_rotates_between_campaigns():
+    queue = SendQueue(None)
+    fill(queue, "bulk", 100, "big")
+    fill(queue, "bulk", 2, "small")
+    fill(queue, "bulk", 3, None)
+    campaigns = [job["campaign"] for _, job in drain(queue, 9)]
+    assert campaigns == ["big", "small", None, "big", "small", None, "big", None, "big"]
+    assert queue.depth() == {"interactive": 0, "scheduled": 0, "bulk": 96}
+
+
+def test_idle_lane_does_not_bank_credit():
+    queue = SendQueue(None)
+    fill(queue, "bulk", 50)
+    drain(queue, 40)
+    # The bulk lane was alone for 40 picks; interactive must not owe it anything now.
+    fill(queue, "interactive", 20)
+    fill(queue, "scheduled", 20)
+    lanes = [lane for lane, _ in drain(queue, 13)]
+    assert Counter(lanes) == {"interactive": 8, "scheduled": 4, "bulk": 1}
+    assert lanes[0] == "interactive"
+
+
+def test_unknown_lane_is_rejected():
+    with pytest.raises(ValueError):
+        SendQueue(None).put({}, "urgent")
+
+
+def test_rate_limiter_refills_at_its_rate():
+    clock = Clock()
+    limiter = RateLimiter(30, burst=2, clock=clock)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    assert limiter.wait_time() == pytest.approx(2.0)
+    clock.now = 1.0
+    assert limiter.wait_time() == pytest.approx(1.0)
+    assert not limiter.try_acquire()
+    clock.now = 2.0
+    assert limiter.wait_time() == 0.0
+    assert limiter.try_acquire()
+    # Idle time never builds more than the burst.
+    clock.now = 100.0
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+
+def test_rate_limiter_refund_returns_a_token_up_to_burst():
+    clock = Clock()
+    limiter = RateLimiter(60, burst=1, clock=clock)
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+    limiter.refund()
+    assert limiter.wait_time() == 0.0
+    assert limiter.try_acquire()
+    limiter.refund()
+    limiter.refund()
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+
+def test_zero_rate_is_unlimited():
+    limiter = RateLimiter(0, clock=Clock())
+    assert all(limiter.try_acquire() for _ in range(1000))
+    assert limiter.wait_time() == 0.0
@@ -0,0 +1,118 @@
+import csv
+import json
+from datetime import datetime
+
+import pytest
+
+from history import append_entry
+from send_stats import LATENCY_LABELS, SendStats, latency_bucket
+
+
+def entry(number="+56912345678", status="Success", latency=None, timestamp="2030-01-01 09:15:00"):
+    result = {"timestamp": timestamp, "number": number, "message": "hola", "status": status, "error": ""}
+    if latency is not None:
+        result["latency"] = latency
+    return result
+
+
+@pytest.fixture
+def history(tmp_path):
+    return str(tmp_path / "send_history.json")
+
+
+@pytest.fixture
+def stats(tmp_path):
+    return SendStats(str(tmp_path / "send_stats.db"), None)
+
+
+def test_latency_buckets_use_upper_bounds():
+    assert [latency_bucket(s) for s in (0, 30, 30.1, 60, 3600, 3601)] == [0, 0, 1, 1, 5, 6]
+    assert len(LATENCY_LABELS) == 7
+
+
+def test_record_updates_every_rollup(stats):
+    stats.record(entry(latency=20))
+    stats.record(entry(status="Failed", timestamp="2030-01-01 10:05:00"))
+    stats.record(entry(number="+56987654321", latency=100, timestamp="2030-01-02 09:00:00"))
+    overall = stats.rows("all")[0]
+    assert (overall["total"], overall["success"], overall["failed"]) == (3, 2, 1)
+    assert overall["success_rate"] == round(2 / 3, 4)
+    assert overall["avg_latency"] == 60.0
+    assert [(row["key"], row["total"]) for row in stats.rows("hour")] == [
+        ("2030-01-01 09:00", 1), ("2030-01-01 10:00", 1), ("2030-01-02 09:00", 1)]
+    assert [(row["key"], row["total"]) for row in stats.rows("day")] == [("2030-01-01", 2), ("2030-01-02", 1)]
+    assert [(row["key"], row["total"]) for row in stats.rows("status")] == [("Failed", 1), ("Success", 2)]
+    assert [row["key"] for row in stats.rows("number", order="total")] == ["+56912345678", "+56987654321"]
+    assert stats.histogram() == dict(zip(LATENCY_LABELS, [1, 0, 1, 0, 0, 0, 0]))
+    assert stats.histogram("day", "2030-01-02")["<=120s"] == 1
+
+
+def test_entry_without_timestamp_counts_only_in_timeless_scopes(stats):
+    stats.record(entry(timestamp="", status=""))
+    assert stats.rows("all")[0]["total"] == 1
+    assert stats.rows("status")[0]["key"] == "Unknown"
+    assert stats.rows("hour") == [] and stats.rows("day") == []
+
+
+def test_summary_windows_and_empty_store(stats):
+    empty = stats.summary(now=datetime(2030, 1, 2, 12))
+    assert empty["overall"]["total"] == 0 and empty["overall"]["success_rate"] is None
+    stats.record(entry(timestamp="2029-12-01 09:00:00"))
+    stats.record(entry(timestamp="2030-01-02 11:30:00", latency=10))
+    summary = stats.summary(now=datetime(2030, 1, 2, 12), hours=24, days=14)
+    assert summary["overall"]["total"] == 2
+    assert [row["key"] for row in summary["hours"]] == ["2030-01-02 11:00"]
+    assert [row["key"] for row in summary["days"]] == ["2030-01-02"]
+    assert summary["top_numbers"][0]["total"] == 2
+    assert summary["latency"]["<=30s"] == 1
+
+
+def test_export_csv_and_json(stats, tmp_path):
+    stats.record(entry(latency=45))
+    stats.record(entry(number="+56987654321", status="Failed"))
+    csv_path = str(tmp_path / "stats.csv")
+    assert stats.export(csv_path) == 7
+    with open(csv_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    overall = next(row for row in rows if row["scope"] == "all")
+    assert (overall["total"], overall["success"], overall["<=60s"]) == ("2", "1", "1")
+    number = next(row for row in rows if row["key"] == "+56987654321")
+    assert number["<=60s"] == ""
+    json_path = str(tmp_path / "stats.json")
+    assert stats.export(json_path) == 7
+    with open(json_path) as f:
+        assert {row["scope"] for row in json.load(f)} == {"all", "status", "hour", "day", "number"}
+    with pytest.raises(ValueError):
+        stats.export(str(tmp_path / "stats.txt"), "xml")
+
+
+def test_seed_runs_once_per_stats_file(history, tmp_path):
+    for i in range(3):
+        append_entry(history, entry(latency=i))
+    path = str(tmp_path / "send_stats.db")
+    assert SendStats(path, history).rows("all")[0]["total"] == 3
+    append_entry(history, entry())
+    # A second process opening the same stats file does not seed again.
+    assert SendStats(path, history).rows("all")[0]["total"] == 3
+
+
+def test_entries_counted_by_the_seed_are_not_recorded_again(history, tmp_path):
+    # Another process appended this entry but had not recorded it when the seed read the history.
+    position = append_entry(history, entry()) - 1
+    stats = SendStats(str(tmp_path / "send_stats.db"), history)
+    stats.record(entry(), position)
+    assert stats.rows("all")[0]["total"] == 1
+    position = append_entry(history, entry()) - 1
+    stats.record(entry(), position)
+    assert stats.rows("all")[0]["total"] == 2
+
+
+def test_rebuild_recomputes_from_history(history, tmp_path):
+    for status in ("Success", "Failed", "Success"):
+        append_entry(history, entry(status=status))
+    stats = SendStats(str(tmp_path / "send_stats.db"), history)
+    stats.record(entry(number="+56900000000"))
+    stats.rebuild(history)
+    assert stats.rows("all")[0]["total"] == 3
+    assert [row["key"] for row in stats.rows("number")] == ["+56912345678"]
+    assert stats.rows("status", order="total")[0]["key"] == "Success"
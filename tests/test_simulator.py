@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import scheduler
+from simulator import FakeBackend, simulate
+
+START = datetime(2030, 1, 1)
+
+
+def batch(count, due="2030-01-01 09:00"):
+    return [{"number": f"+569{i:08d}", "message": "hola", "due": due, "priority": "bulk", "campaign": "promo"}
+            for i in range(count)]
+
+
+def settings(accounts=1, **overrides):
+    return dict(scheduler.DEFAULT_SETTINGS, accounts=[{"name": f"account-{i}"} for i in range(accounts)], **overrides)
+
+
+def test_rate_limit_applies_per_account():
+    jobs = batch(600)
+    one = simulate(jobs, FakeBackend(1.0, distribution="fixed"), settings(1), 3, 1, START)
+    three = simulate(jobs, FakeBackend(1.0, distribution="fixed"), settings(3), 3, 1, START)
+    assert one["sent"] == three["sent"] == 600
+    assert 2.5 < three["throughput_per_hour"] / one["throughput_per_hour"] < 3.5
+
+
+def test_one_account_sends_one_message_at_a_time():
+    report = simulate(batch(100), FakeBackend(60.0, distribution="fixed"), settings(1), 4, 0, START)
+    assert 59 <= report["throughput_per_hour"] <= 61
+
+
+def test_large_batch_under_claim_cap_is_not_missed():
+    for policy in scheduler.CATCH_UP_POLICIES:
+        report = simulate(batch(300), FakeBackend(45.0, distribution="fixed"), settings(1, catch_up=policy), 1, None, START)
+        assert (report["sent"], report["missed"], report["rescheduled"]) == (300, 0, 0)
+
+
+def test_jobs_due_before_start_follow_catch_up_policy():
+    jobs = batch(5, "2030-01-01 08:00") + batch(5, "2030-01-01 06:00")
+    report = simulate(jobs, FakeBackend(45.0, distribution="fixed"), settings(1, catch_up="send_late"), 1, None,
+                      datetime(2030, 1, 1, 8, 30))
+    assert (report["sent"], report["missed"]) == (5, 5)
+
+
+def test_peak_queue_depth_counts_due_jobs_not_yet_claimed():
+    report = simulate(batch(300), FakeBackend(45.0, distribution="fixed"), settings(1, claim_batch=10), 1, None, START)
+    assert report["peak_queue_depth"] == 300
+
+
+def test_interactive_job_is_claimed_ahead_of_a_due_bulk_batch():
+    urgent = {"number": "+56999999999", "message": "urgente", "due": "2030-01-01 09:05", "priority": "interactive"}
+    report = simulate(batch(300) + [urgent], FakeBackend(45.0, distribution="fixed"), settings(1), 1, None, START)
+    assert report["sent"] == 301
+    # At most one check plus the send in flight and its own send, while the bulk batch takes hours.
+    assert report["lane_p99_lateness_seconds"]["interactive"] <= 2 * 45 + scheduler.CHECK_INTERVAL
+    assert report["lane_p99_lateness_seconds"]["bulk"] > 3600
+
+
+def test_coalescing_merges_messages_to_the_same_number():
+    jobs = [{"number": "+56912345678", "message": f"parte {i}", "due": f"2030-01-01 09:0{i}"} for i in range(3)]
+    jobs.append({"number": "+56987654321", "message": "otro", "due": "2030-01-01 09:01"})
+    backend = FakeBackend(45.0, distribution="fixed")
+    report = simulate(jobs, backend, settings(1, coalesce_window_minutes=5), 1, None, START)
+    assert (report["sent"], report["coalesced"], report["unsent"]) == (4, 3, 0)
+    # The 09:02 part rode along with the 09:00 send, so everything was out before 09:02.
+    assert report["finished_at"] == "2030-01-01 09:01:45"
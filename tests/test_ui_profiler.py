@@ -0,0 +1,35 @@
+import pstats
+import threading
+
+from ui_profiler import UIProfiler
+
+
+class Page:
+    def update(self):
+        pass
+
+
+class App:
+    def __init__(self):
+        self.page = Page()
+
+    def update_history_view(self):
+        self.page.update()
+
+    def toggle_history_view(self, e):
+        self.update_history_view()
+
+
+def test_capture_traces_handlers_run_on_other_threads(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    app = App()
+    profiler = UIProfiler(app.page, str(tmp_path / "ui_profile.json"))
+    profiler.instrument(app)
+    profiler.toggle_cprofile()
+    worker = threading.Thread(target=app.toggle_history_view, args=(None,))
+    worker.start()
+    worker.join()
+    path = profiler.toggle_cprofile()
+    profiled = {function for _, _, function in pstats.Stats(path).stats}
+    assert {"toggle_history_view", "update_history_view"} <= profiled
+    assert profiler.stats["toggle_history_view"]["updates"] == 1
@@ -0,0 +1,110 @@
+import cProfile
+import functools
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+HANDLERS = (
+    "schedule_message",
+    "test_send",
+    "show_date_picker",
+    "show_time_picker",
+    "update_responsive_layout",
+    "update_history_view",
+    "toggle_history_view",
+    "load_older_history",
+    "show_stats",
+    "export_stats",
+    "open_PERSON_web",
+    "save_and_exit"
+)
+
+
+def count_controls(control):
+    children = control._get_children() if hasattr(control, "_get_children") else []
+    return 1 + sum(count_controls(child) for child in children if child is not None)
+
+
+class UIProfiler:
+    """Opt-in timing of UI handlers: wall time, page.update calls and control count per call."""
+
+    def __init__(self, page, summary_file="ui_profile.json"):
+        self.page = page
+        self.summary_file = summary_file
+        self.updates = 0
+        self.stats = {}
+        self.profile = None
+        self.profile_lock = threading.RLock()
+        self.profiling = threading.local()
+        original_update = page.update
+
+        def counted_update(*args, **kwargs):
+            self.updates += 1
+            return original_update(*args, **kwargs)
+
+        page.update = counted_update
+
+    def instrument(self, target, names=HANDLERS):
+        for name in names:
+            if hasattr(target, name):
+                setattr(target, name, self.wrap(name, getattr(target, name)))
+
+    def wrap(self, name, handler):
+        @functools.wraps(handler)
+        def timed(*args, **kwargs):
+            updates = self.updates
+            start = time.perf_counter()
+            try:
+                profile = self.profile
+                if profile is None or getattr(self.profiling, "active", False):
+                    return handler(*args, **kwargs)
+                # Flet runs handlers on worker threads, and a Profile only traces the thread
+                # it runs on, so each handler is profiled where it executes.
+                with self.profile_lock:
+                    self.profiling.active = True
+                    try:
+                        return profile.runcall(handler, *args, **kwargs)
+                    finally:
+                        self.profiling.active = False
+            finally:
+                self.record(name, time.perf_counter() - start, self.updates - updates)
+        return timed
+
+    def record(self, name, elapsed, updates):
+        controls = count_controls(self.page)
+        stat = self.stats.setdefault(name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "updates": 0, "controls": 0})
+        stat["calls"] += 1
+        stat["total_ms"] += elapsed * 1000
+        stat["max_ms"] = max(stat["max_ms"], elapsed * 1000)
+        stat["updates"] += updates
+        stat["controls"] = controls
+        logging.info(f"UI {name}: {elapsed * 1000:.1f} ms, {updates} page.update calls, {controls} controls")
+
+    def toggle_cprofile(self):
+        if self.profile is None:
+            self.profile = cProfile.Profile()
+            logging.info("UI cProfile capture started")
+            return None
+        profile, self.profile = self.profile, None
+        path = f"ui_profile_{datetime.now():%Y%m%d_%H%M%S}.prof"
+        with self.profile_lock:
+            profile.dump_stats(path)
+        logging.info(f"UI cProfile capture saved to {path}")
+        return path
+
+    def on_keyboard(self, e):
+        if e.key == "F9" and self.toggle_cprofile():
+            self.save_summary()
+
+    def save_summary(self):
+        if self.profile is not None:
+            self.toggle_cprofile()
+        summary = {
+            name: dict(stat, avg_ms=round(stat["total_ms"] / stat["calls"], 2), total_ms=round(stat["total_ms"], 2), max_ms=round(stat["max_ms"], 2))
+            for name, stat in sorted(self.stats.items(), key=lambda item: -item[1]["total_ms"])
+        }
+        with open(self.summary_file, "w") as f:
+            json.dump(summary, f, indent=2)
+        logging.info(f"UI profile summary saved to {self.summary_file}")